@@ -0,0 +1,170 @@
+import argparse
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+from main import (
+    JOBS,
+    add_arguments,
+    decoder_threads,
+    finish_lecture,
+    find_htmls,
+    prepare_lecture,
+    title_from_html,
+)
+from progress import event, log, setup_logging
+from video import set_decoder_budget, set_decoder_threads
+
+# lectures whose video stage runs at the same time; with the shared ffmpeg
+# budget below this can be generous without oversubscribing the CPU
+LECTURES = JOBS
+
+# ffmpeg processes (or PyAV decoders) running at once across all lectures
+MAX_FFMPEG = JOBS
+
+# processes parsing HTML and writing markdown
+PARSE_WORKERS = JOBS
+
+
+def timed_prepare(
+    input_html: str, args: argparse.Namespace, exclude: set[str]
+) -> tuple[dict, float]:
+    # runs in a worker process, which never decodes video: everything that
+    # runs ffmpeg is left to finish_lecture in the main process
+    if not log.handlers:
+        # a spawned worker starts with logging unconfigured
+        setup_logging(args.quiet, args.log_json)
+    start = time.perf_counter()
+    lecture = prepare_lecture(input_html, args, exclude)
+    return lecture, time.perf_counter() - start
+
+
+def timed_finish(lecture: dict, args: argparse.Namespace) -> tuple[dict, float]:
+    # runs on a thread of the main process, drawing on the shared budget
+    start = time.perf_counter()
+    result = finish_lecture(lecture, args)
+    return result, time.perf_counter() - start
+
+
+def failed(title: str, e: BaseException, seconds: float = 0.0) -> dict:
+    traceback.print_exception(e)
+    return {"title": title, "status": f"failed: {e}", "seconds": seconds}
+
+
+def run_batch(input_htmls: list[str], args: argparse.Namespace) -> list[dict]:
+    # HTML parsing and markdown (CPU-bound Python) go to a process pool; as
+    # each lecture is parsed its video stage is queued on a thread pool,
+    # where every ffmpeg call takes a slot from one --max-ffmpeg budget
+    set_decoder_budget(args.max_ffmpeg)
+    set_decoder_threads(decoder_threads(args, args.max_ffmpeg))
+
+    titles = {title_from_html(h) for h in input_htmls}
+    results: dict[str, dict] = {}
+    parse_time: dict[str, float] = {}
+
+    with (
+        ProcessPoolExecutor(max_workers=max(1, args.parse_workers)) as procs,
+        ThreadPoolExecutor(max_workers=max(1, args.lectures)) as threads,
+    ):
+        pending: dict[Future, tuple[str, str]] = {}
+        for h in input_htmls:
+            title = title_from_html(h)
+            fut = procs.submit(timed_prepare, h, args, titles - {title})
+            pending[fut] = ("parse", title)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage, title = pending.pop(fut)
+                try:
+                    result, seconds = fut.result()
+                except Exception as e:
+                    results[title] = failed(title, e, parse_time.get(title, 0.0))
+                    continue
+
+                if stage == "parse":
+                    parse_time[title] = seconds
+                    nxt = threads.submit(timed_finish, result, args)
+                    pending[nxt] = ("video", title)
+                else:
+                    result["status"] = "skipped" if result.get("skipped") else "ok"
+                    result["seconds"] = parse_time[title] + seconds
+                    results[title] = result
+
+    return [results[title_from_html(h)] for h in input_htmls]
+
+
+def print_summary(results: list[dict]) -> None:
+    print()
+    print(f"{'lecture':<40} {'slides':>6} {'video':>5} {'time (s)':>9}  status")
+    for r in results:
+        slides = r.get("slides", "-")
+        video = "yes" if r.get("video") else "no"
+        print(
+            f"{r['title'][:40]:<40} {slides:>6} {video:>5} "
+            f"{r['seconds']:>9.1f}  {r['status']}"
+        )
+
+    failed = sum(r["status"].startswith("failed") for r in results)
+    print(f"{len(results) - failed} of {len(results)} lectures done, {failed} failed.")
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(
+        description="Process every saved leccap page in the current directory."
+    )
+    add_arguments(arg_parser)
+    arg_parser.add_argument(
+        "--lectures",
+        type=int,
+        default=LECTURES,
+        help=f"lectures in their video stage at once (default: {LECTURES})",
+    )
+    arg_parser.add_argument(
+        "--max-ffmpeg",
+        type=int,
+        default=MAX_FFMPEG,
+        help=f"ffmpeg processes running at once across all lectures "
+        f"(default: {MAX_FFMPEG})",
+    )
+    arg_parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=PARSE_WORKERS,
+        help=f"processes parsing HTML and writing markdown (default: {PARSE_WORKERS})",
+    )
+
+    return arg_parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    setup_logging(args.quiet, args.log_json)
+
+    input_htmls = find_htmls()
+    event(
+        logging.INFO,
+        "batch",
+        "Found %d lectures in %s",
+        len(input_htmls),
+        os.getcwd(),
+        lectures=len(input_htmls),
+    )
+
+    results = run_batch(input_htmls, args)
+
+    print_summary(results)
+    if any(r["status"].startswith("failed") for r in results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,532 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import subprocess
+import tempfile
+import time
+from typing import Any, Callable
+from PIL import Image, ImageChops, ImageStat
+
+import main
+from page import PARSERS, LecturePage
+from pdf import JPEG_QUALITY, write_jpeg_pdf, write_pdf
+from progress import log
+from video import (
+    SEEK_MODES,
+    ffmpeg_frame_image,
+    ffmpeg_frames_pipe,
+    iter_frames,
+    iter_jpegs,
+    keyframes,
+    set_decoder_threads,
+)
+
+
+def report(rows: list[dict], json_path: str | None) -> None:
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as fp:
+            json.dump(rows, fp, indent=2)
+        print(f"Results written to {json_path}")
+
+
+def bench_pdf(args: argparse.Namespace) -> list[dict]:
+    # PDF size and wall time of every frame -> PDF route on one video
+    timestamps = [args.start + i * args.step for i in range(args.count)]
+
+    rows = []
+    for mode in args.modes:
+        for route in ("png", "reencode", "jpeg"):
+            with tempfile.TemporaryDirectory() as tmp:
+                pdf_path = os.path.join(tmp, main.OUTPUT_PDF)
+                start = time.perf_counter()
+
+                if route == "png":
+                    # the old pipeline: PNG assets, read back into the PDF
+                    os.makedirs(os.path.join(tmp, main.ASSETS_DIR))
+                    main.grab_screenshots(tmp, args.video, timestamps, args.jobs, mode)
+                    main.images_to_pdf(tmp, args.quality)
+                    pages = len(timestamps)
+                elif route == "reencode":
+                    frames = iter_frames(args.video, timestamps, mode, args.jobs)
+                    pages = write_pdf(pdf_path, (im for _, im in frames), args.quality)
+                else:
+                    jpegs = iter_jpegs(
+                        args.video, timestamps, mode, args.jobs, args.quality
+                    )
+                    pages = write_jpeg_pdf(pdf_path, (data for _, data in jpegs))
+
+                wall = time.perf_counter() - start
+                size = os.path.getsize(pdf_path)
+
+            rows.append(
+                {
+                    "mode": mode,
+                    "route": route,
+                    "pages": pages,
+                    "wall": wall,
+                    "size": size,
+                }
+            )
+
+    print(f"{'mode':<6} {'route':<9} {'pages':>5} {'wall (s)':>9} {'size (MB)':>10}")
+    for r in rows:
+        print(
+            f"{r['mode']:<6} {r['route']:<9} {r['pages']:>5} "
+            f"{r['wall']:>9.2f} {r['size'] / 1e6:>10.2f}"
+        )
+
+    return rows
+
+
+def frame_id(image: Image.Image) -> tuple[str, Image.Image]:
+    # exact identity of a frame, plus a small grayscale copy to measure how
+    # far off a wrong one is
+    digest = hashlib.sha256(image.tobytes()).hexdigest()
+    return digest, image.convert("L").resize((160, 90))
+
+
+def bench_seek(args: argparse.Namespace) -> list[dict]:
+    # per-frame latency and frame accuracy of each seek strategy, one ffmpeg
+    # process at a time; the reference frames come from the batch select
+    # pass, which decodes everything and never seeks
+    timestamps = [args.start + i * args.step for i in range(args.count)]
+
+    if "hybrid" in args.seeks:
+        # only hybrid seeking needs the keyframes, and the probe is ffprobe
+        start = time.perf_counter()
+        kfs = keyframes(args.video)
+        probe = time.perf_counter() - start
+        gaps = [b - a for a, b in zip(kfs, kfs[1:])]
+        if gaps:
+            print(
+                f"{len(kfs)} keyframes, GOP mean {sum(gaps) / len(gaps):.2f}s, "
+                f"max {max(gaps):.2f}s (probed in {probe:.2f}s)"
+            )
+
+    frames = ffmpeg_frames_pipe(args.video, timestamps)
+    reference = {ts: frame_id(image) for ts, image in frames}
+    if not reference:
+        raise RuntimeError("No frames could be extracted from the video.")
+
+    rows = []
+    for seek in args.seeks:
+        latencies = []
+        exact = 0
+        error = 0.0
+        for ts in reference:
+            start = time.perf_counter()
+            image = ffmpeg_frame_image(args.video, ts, seek)
+            latencies.append(time.perf_counter() - start)
+            if image is None:
+                continue
+
+            digest, small = frame_id(image)
+            ref_digest, ref_small = reference[ts]
+            exact += digest == ref_digest
+            error += ImageStat.Stat(ImageChops.difference(small, ref_small)).mean[0]
+
+        latencies.sort()
+        count = len(latencies)
+        rows.append(
+            {
+                "seek": seek,
+                "frames": count,
+                "mean": sum(latencies) / count,
+                "p95": latencies[min(count - 1, int(count * 0.95))],
+                "exact": exact / count,
+                "error": error / count,
+            }
+        )
+
+    print(
+        f"{'seek':<9} {'frames':>6} {'mean (ms)':>10} {'p95 (ms)':>9} "
+        f"{'exact':>6} {'error':>6}"
+    )
+    for r in rows:
+        print(
+            f"{r['seek']:<9} {r['frames']:>6} {r['mean'] * 1000:>10.1f} "
+            f"{r['p95'] * 1000:>9.1f} {r['exact']:>6.0%} {r['error']:>6.2f}"
+        )
+
+    return rows
+
+
+def bench_threads(args: argparse.Namespace) -> list[dict]:
+    # wall time of the same extraction under each decoder thread count, with
+    # --jobs ffmpeg processes running at once (0 is ffmpeg's own default)
+    timestamps = [args.start + i * args.step for i in range(args.count)]
+
+    rows = []
+    for jobs in args.jobs:
+        auto = max(1, main.JOBS // jobs)
+        for threads in sorted({0, 1, auto, main.JOBS, *args.threads}):
+            set_decoder_threads(threads)
+            start = time.perf_counter()
+            frames = sum(1 for _ in iter_frames(args.video, timestamps, "seek", jobs))
+            wall = time.perf_counter() - start
+            rows.append(
+                {
+                    "jobs": jobs,
+                    "threads": threads,
+                    "auto": threads == auto,
+                    "frames": frames,
+                    "wall": wall,
+                }
+            )
+    set_decoder_threads(0)
+
+    print(f"{'jobs':>4} {'threads':>8} {'frames':>6} {'wall (s)':>9} {'frames/s':>9}")
+    for r in rows:
+        threads = f"{r['threads']}{'*' if r['auto'] else ''}"
+        print(
+            f"{r['jobs']:>4} {threads:>8} {r['frames']:>6} "
+            f"{r['wall']:>9.2f} {r['frames'] / r['wall']:>9.1f}"
+        )
+    print("* the default for that many jobs")
+
+    return rows
+
+
+def thumb_deck(pattern: str, count: int, seed: int = 0) -> list[int | None]:
+    # raw thumbnail timestamps, 10s apart when in order
+    rng = random.Random(seed)
+    ordered = [i * 10 for i in range(count)]
+
+    if pattern == "sorted":
+        deck = ordered
+    elif pattern == "reversed":
+        # every thumbnail invalidates the one before it
+        deck = ordered[::-1]
+    elif pattern == "sawtooth":
+        # slides restarting every 100 thumbnails: long invalid runs
+        deck = [(i % 100) * 10 + i // 100 for i in range(count)]
+    elif pattern == "late-drop":
+        # one early timestamp at the end invalidates the whole deck
+        deck = ordered[1:] + [1]
+    elif pattern == "shuffled":
+        deck = ordered[:]
+        rng.shuffle(deck)
+    else:
+        # mostly in order with scattered bad labels and missing labels
+        deck = [
+            None if rng.random() < 0.01 else ts - rng.choice((0, 0, 0, 25))
+            for ts in ordered
+        ]
+
+    return [None] + deck
+
+
+THUMB_PATTERNS = ["sorted", "reversed", "sawtooth", "late-drop", "shuffled", "noisy"]
+
+
+def bench_thumbs(args: argparse.Namespace) -> list[dict]:
+    # invalid thumbnail timestamp repair on synthetic decks
+    rows = []
+    for pattern in args.patterns:
+        deck = thumb_deck(pattern, args.count)
+
+        wall, thumbs = timed(main.repair_thumbs, deck, repeat=args.repeat)
+        warnings = count_events("invalid_thumb", main.repair_thumbs, deck)
+        rows.append(
+            {
+                "pattern": pattern,
+                "thumbs": len(thumbs),
+                "warnings": warnings,
+                "wall": wall,
+            }
+        )
+
+    print(f"{'pattern':<10} {'thumbs':>7} {'warnings':>8} {'wall (ms)':>10}")
+    for r in rows:
+        print(
+            f"{r['pattern']:<10} {r['thumbs']:>7} {r['warnings']:>8} "
+            f"{r['wall'] * 1000:>10.2f}"
+        )
+
+    return rows
+
+
+def thumb_label(ts: int | None) -> str:
+    # leccap's aria-label for a thumbnail; the first one has no time
+    if ts is None:
+        return "Thumbnail"
+    h, r = divmod(max(ts, 0), 3600)
+    m, s = divmod(r, 60)
+    parts = [f"{h} hours"] if h else []
+    parts += [f"{m} minutes", f"{s} seconds"]
+    return "Thumbnail at " + " ".join(parts)
+
+
+def write_page(
+    path: str,
+    title: str,
+    rows: int,
+    deck: list[int | None],
+    duration: int,
+    pad_kb: int = 0,
+) -> None:
+    # a saved leccap page with the markup the parsers look for; pad_kb of
+    # inline script stands in for the bundles a real page carries
+    rng = random.Random(1)
+    words = "the a slide lecture matrix vector proof &amp; <b>bold</b> x&lt;y".split()
+
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(f"<!DOCTYPE html><html><head><title>{title}</title>\n")
+        fp.write("<script>" + "var x=1;//" * (pad_kb * 100) + "</script>\n")
+        fp.write('</head><body><div class="thumbnails">\n')
+        for n, ts in enumerate(deck):
+            fp.write(
+                f'<div class="thumbnail" aria-label="{thumb_label(ts)}">'
+                f'<div style="background-image: url(&quot;thumb/{n}.jpg&quot;)">'
+                "</div></div>\n"
+            )
+        fp.write('</div><div class="transcript">\n')
+        for i in range(rows):
+            ts = i * duration // rows
+            clock = f"{ts // 3600}:{ts // 60 % 60:02}:{ts % 60:02}"
+            if ts < 3600:
+                clock = clock[2:]
+            text = " ".join(rng.choice(words) for _ in range(12))
+            fp.write(
+                '<div class="transcript-row">'
+                f'<div class="transcript-time">{clock}</div>'
+                f'<div class="transcript-text"> {text}\n</div></div>\n'
+            )
+        fp.write("</div></body></html>\n")
+
+
+def write_video(path: str, duration: int) -> None:
+    # ffmpeg's test pattern, encoded with a long GOP like the lecture videos
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-nostdin",
+        "-f",
+        "lavfi",
+        "-i",
+        f"testsrc=duration={duration}:size=1280x720:rate=10",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "ultrafast",
+        "-g",
+        "100",
+        "-pix_fmt",
+        "yuv420p",
+        path,
+    ]
+    subprocess.run(
+        cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def timed(fn: Callable, *args: Any, repeat: int = 1) -> tuple[float, Any]:
+    # best wall time of repeat calls, and the last result
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+
+    return best, result
+
+
+class EventCounter(logging.Handler):
+    def __init__(self, name: str) -> None:
+        super().__init__(logging.DEBUG)
+        self.name = name
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.count += getattr(record, "event", None) == self.name
+
+
+def count_events(name: str, fn: Callable, *args: Any) -> int:
+    # events called name that one call of fn emits, debug ones included
+    counter = EventCounter(name)
+    level = log.level
+    log.addHandler(counter)
+    log.setLevel(logging.DEBUG)
+    try:
+        fn(*args)
+    finally:
+        log.removeHandler(counter)
+        log.setLevel(level)
+
+    return counter.count
+
+
+def compare(rows: list[dict], baseline_path: str, tolerance: float) -> None:
+    # mark every stage slower than its baseline by more than tolerance
+    with open(baseline_path, "r", encoding="utf-8") as fp:
+        baseline = {r["stage"]: r["wall"] for r in json.load(fp)}
+
+    for r in rows:
+        base = baseline.get(r["stage"])
+        if base is None:
+            continue
+        r["baseline"] = base
+        r["regressed"] = r["wall"] > base * (1 + tolerance)
+
+
+def bench_e2e(args: argparse.Namespace) -> list[dict]:
+    # every stage of main.py on a synthetic lecture: a generated page with
+    # args.rows transcript rows and args.thumbs thumbnails, and a test video
+    duration = args.thumbs * 10 + 10
+    deck = thumb_deck(args.pattern, args.thumbs)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        title = os.path.join(tmp, "lecture")
+        os.makedirs(os.path.join(title, main.ASSETS_DIR))
+        html = os.path.join(tmp, "lecture.html")
+        video = os.path.join(tmp, "lecture.mp4")
+
+        write_page(html, "lecture", args.rows, deck, duration, args.pad_kb)
+        size = f"{os.path.getsize(html) / 1e6:.1f}"
+        if not args.no_video:
+            write_video(video, duration)
+
+        wall, page = timed(
+            LecturePage, html, args.parser, args.whole_page, repeat=args.repeat
+        )
+        rows.append({"stage": "parse", "wall": wall})
+        wall, subs = timed(main.extract_subs, page, repeat=args.repeat)
+        rows.append({"stage": "extract_subs", "wall": wall})
+        wall, thumbs = timed(main.extract_thumb, page, repeat=args.repeat)
+        rows.append({"stage": "extract_thumb", "wall": wall})
+        wall, _ = timed(main.output_markdown, title, subs, thumbs, repeat=args.repeat)
+        rows.append({"stage": "output_markdown", "wall": wall})
+
+        if not args.no_video:
+            wall, pngs = timed(
+                main.grab_screenshots, title, video, thumbs, args.jobs, args.mode
+            )
+            rows.append({"stage": "grab_screenshots", "wall": wall})
+            wall, _ = timed(main.images_to_pdf, title, JPEG_QUALITY, pngs)
+            rows.append({"stage": "images_to_pdf", "wall": wall})
+
+    if args.baseline:
+        compare(rows, args.baseline, args.tolerance)
+
+    print(f"{args.rows} rows, {args.thumbs} thumbnails ({args.pattern}), {size} MB")
+    print(f"{'stage':<17} {'wall (ms)':>10} {'baseline':>10}")
+    for r in rows:
+        base = f"{r['baseline'] * 1000:>10.1f}" if "baseline" in r else f"{'-':>10}"
+        flag = "  REGRESSED" if r.get("regressed") else ""
+        print(f"{r['stage']:<17} {r['wall'] * 1000:>10.1f} {base}{flag}")
+
+    return rows
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(description="Benchmarks for the pipeline.")
+    arg_parser.add_argument("--json", help="also write the results to this file")
+    sub = arg_parser.add_subparsers(dest="bench", required=True)
+
+    pdf = sub.add_parser("pdf", help="PDF size and wall time per frame route")
+    pdf.add_argument("video", help="lecture .mp4 to grab frames from")
+    pdf.add_argument("--count", type=int, default=50, help="frames to grab")
+    pdf.add_argument("--start", type=int, default=0, help="first timestamp (s)")
+    pdf.add_argument("--step", type=int, default=30, help="seconds between frames")
+    pdf.add_argument("--jobs", type=int, default=main.JOBS)
+    pdf.add_argument("--quality", type=int, default=JPEG_QUALITY)
+    pdf.add_argument(
+        "--modes",
+        nargs="+",
+        default=main.EXTRACT_MODES,
+        choices=main.EXTRACT_MODES,
+        help="extraction modes to compare",
+    )
+    pdf.set_defaults(func=bench_pdf)
+
+    seek = sub.add_parser("seek", help="per-frame latency and accuracy per seek")
+    seek.add_argument("video", help="lecture .mp4 to grab frames from")
+    seek.add_argument("--count", type=int, default=50, help="frames to grab")
+    seek.add_argument("--start", type=int, default=0, help="first timestamp (s)")
+    seek.add_argument("--step", type=int, default=30, help="seconds between frames")
+    seek.add_argument(
+        "--seeks",
+        nargs="+",
+        default=SEEK_MODES,
+        choices=SEEK_MODES,
+        help="seek strategies to compare",
+    )
+    seek.set_defaults(func=bench_seek)
+
+    threads = sub.add_parser("threads", help="wall time per decoder thread count")
+    threads.add_argument("video", help="lecture .mp4 to grab frames from")
+    threads.add_argument("--count", type=int, default=50, help="frames to grab")
+    threads.add_argument("--start", type=int, default=0, help="first timestamp (s)")
+    threads.add_argument("--step", type=int, default=30, help="seconds between frames")
+    threads.add_argument(
+        "--jobs",
+        type=int,
+        nargs="+",
+        default=[1, main.JOBS],
+        help="parallel ffmpeg processes to try",
+    )
+    threads.add_argument(
+        "--threads",
+        type=int,
+        nargs="*",
+        default=[],
+        help="thread counts to try besides 0, 1, CPUs/jobs and CPUs",
+    )
+    threads.set_defaults(func=bench_threads)
+
+    e2e = sub.add_parser("e2e", help="every stage on a synthetic lecture")
+    e2e.add_argument("--rows", type=int, default=2000, help="transcript rows")
+    e2e.add_argument("--thumbs", type=int, default=60, help="thumbnails")
+    e2e.add_argument(
+        "--pattern",
+        default="noisy",
+        choices=THUMB_PATTERNS,
+        help="thumbnail label ordering (default: noisy)",
+    )
+    e2e.add_argument(
+        "--pad-kb", type=int, default=0, help="KB of inline script in the page"
+    )
+    e2e.add_argument("--parser", default="auto", choices=["auto", *PARSERS])
+    e2e.add_argument("--whole-page", action="store_true", help="parse the entire page")
+    e2e.add_argument("--jobs", type=int, default=main.JOBS)
+    e2e.add_argument("--mode", default=main.EXTRACT_MODE, choices=main.EXTRACT_MODES)
+    e2e.add_argument("--repeat", type=int, default=3, help="best of N (HTML stages)")
+    e2e.add_argument(
+        "--no-video", action="store_true", help="skip the ffmpeg and PDF stages"
+    )
+    e2e.add_argument("--baseline", help="JSON of an earlier run to compare with")
+    e2e.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="slowdown over the baseline counted as a regression (default: 0.2)",
+    )
+    e2e.set_defaults(func=bench_e2e)
+
+    thumbs = sub.add_parser("thumbs", help="thumbnail timestamp repair time")
+    thumbs.add_argument("--count", type=int, default=20000, help="thumbnails per deck")
+    thumbs.add_argument("--repeat", type=int, default=5, help="best of N runs")
+    thumbs.add_argument(
+        "--patterns",
+        nargs="+",
+        default=THUMB_PATTERNS,
+        choices=THUMB_PATTERNS,
+        help="deck orderings to time",
+    )
+    thumbs.set_defaults(func=bench_thumbs)
+
+    return arg_parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    # the stages' own messages would time the terminal, not the stage
+    log.setLevel(logging.ERROR)
+    args = parse_args()
+    rows = args.func(args)
+    report(rows, args.json)
+    if any(r.get("regressed") for r in rows):
+        raise SystemExit(1)
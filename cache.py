@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+from typing import Any
+
+# per-lecture manifest, stored in the lecture's output directory
+CACHE_MANIFEST = ".leccap-cache.json"
+
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        while chunk := fp.read(chunk_size):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def video_key(path: str) -> dict[str, Any]:
+    # hashing a multi-GB video costs more than most stages, so size + mtime
+    st = os.stat(path)
+    return {"name": os.path.basename(path), "size": st.st_size, "mtime": st.st_mtime_ns}
+
+
+def value_hash(value: Any) -> str:
+    # stable digest of any JSON-serialisable value (e.g. the thumbnail list)
+    data = json.dumps(value, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def part_path(path: str) -> str:
+    # temporary name next to path, keeping the extension for ffmpeg/PIL;
+    # files are written there and renamed, so a crash never leaves half a
+    # file under the real name
+    root, ext = os.path.splitext(path)
+    return f"{root}.part{ext}"
+
+
+class Manifest:
+    # what each stage last produced, and from which inputs; a stage whose
+    # key still matches and whose outputs all exist does not need to rerun
+    def __init__(self, out_dir: str) -> None:
+        self.dir = out_dir
+        self.path = os.path.join(out_dir, CACHE_MANIFEST)
+        self.stages: dict[str, dict[str, Any]] = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as fp:
+                    self.stages = json.load(fp)
+            except (OSError, ValueError):
+                # unreadable manifest: just redo everything
+                self.stages = {}
+
+    def get(self, stage: str, key: dict[str, Any]) -> dict[str, Any] | None:
+        entry = self.stages.get(stage)
+        if not entry or entry.get("key") != key:
+            return None
+        outputs = entry.get("outputs", [])
+        if not all(os.path.exists(os.path.join(self.dir, p)) for p in outputs):
+            return None
+
+        return entry
+
+    def put(
+        self, stage: str, key: dict[str, Any], outputs: list[str], **data: Any
+    ) -> None:
+        # outputs are kept relative to the directory, which may be renamed
+        outputs = [os.path.relpath(p, self.dir) for p in outputs]
+        self.stages[stage] = {"key": key, "outputs": outputs, **data}
+        self.save()
+
+    def update(self, stage: str, **data: Any) -> None:
+        # add to an entry, keeping its key and outputs
+        if stage in self.stages:
+            self.stages[stage].update(data)
+            self.save()
+
+    def drop(self, stage: str) -> None:
+        if self.stages.pop(stage, None) is not None:
+            self.save()
+
+    def save(self) -> None:
+        tmp = part_path(self.path)
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump(self.stages, fp, indent=2)
+        os.replace(tmp, self.path)
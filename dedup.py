@@ -0,0 +1,99 @@
+import logging
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+from PIL import Image
+
+from progress import Progress, event
+from video import SEEK_MODE, iter_proxy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# the hash compares HASH_SIZE x HASH_SIZE horizontal gradients; slides share
+# a template, so 8x8 (the usual dHash) is too coarse to tell them apart
+HASH_SIZE = 16
+# (width, height) of the image the hash is taken from
+HASH_GRID = (HASH_SIZE + 1, HASH_SIZE)
+# frames at most this many bits apart are the same slide; a new line of text
+# already flips a few bits, so this only absorbs encoding noise
+DEDUP_THRESHOLD = 2
+
+T = TypeVar("T")
+
+
+def grid_hash(pixels: Any) -> int:
+    # difference hash of a HASH_SIZE x (HASH_SIZE + 1) grayscale array: one
+    # bit per pixel, set when it is brighter than its right neighbour
+    bits = np.packbits(pixels[:, :-1] > pixels[:, 1:])
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+def dhash(im: Image.Image) -> int:
+    if np is None:
+        raise RuntimeError("Slide deduplication needs NumPy (pip install numpy).")
+
+    small = im.convert("L").resize(HASH_GRID, Image.Resampling.BOX)
+    return grid_hash(np.asarray(small))
+
+
+def png_hash(path: str) -> int:
+    with Image.open(path) as im:
+        return dhash(im)
+
+
+def dedup_frames(
+    frames: Iterable[tuple[int, T]],
+    hash_of: Callable[[T], int],
+    threshold: int = DEDUP_THRESHOLD,
+) -> Iterator[tuple[int, T]]:
+    # consecutive frames within threshold bits of the first one of their run
+    # are one slide; each run yields its last frame (a slide built up bullet
+    # by bullet is complete by then) under its first timestamp (when the
+    # slide appeared). Only one frame is held back at a time.
+    start = base = last = None
+    dropped = 0
+
+    for ts, frame in frames:
+        h = hash_of(frame)
+        if base is not None and (h ^ base).bit_count() <= threshold:
+            last = frame
+            dropped += 1
+            continue
+
+        if base is not None:
+            yield start, last
+        start, base, last = ts, h, frame
+
+    if base is not None:
+        yield start, last
+
+    if dropped:
+        event(
+            logging.INFO,
+            "dedup",
+            "Dropped %d duplicate slides",
+            dropped,
+            dropped=dropped,
+        )
+
+
+def dedup_video(
+    input_video: str,
+    timestamps: list[int],
+    threshold: int = DEDUP_THRESHOLD,
+    mode: str = "seek",
+    jobs: int = 1,
+    seek: str = SEEK_MODE,
+) -> list[tuple[int, int]]:
+    # the same runs as dedup_frames, decided on proxy frames decoded straight
+    # at hash size; gives (slide ts, ts of the frame to show) so that only
+    # the frames shown need decoding at full resolution
+    proxy = iter_proxy(input_video, timestamps, HASH_GRID, mode, jobs, seek)
+    with Progress("dedup", len(timestamps)) as bar:
+        runs = dedup_frames(
+            ((ts, (ts, pixels)) for ts, pixels in bar.wrap(proxy)),
+            lambda frame: grid_hash(frame[1]),
+            threshold,
+        )
+        return [(start, shown) for start, (shown, _) in runs]
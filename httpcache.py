@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+from progress import event
+
+# shared by every lecture and run
+CACHE_DIR = Path(os.environ.get("LECCAP_CACHE", Path.home() / ".cache" / "leccap"))
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+# entries younger than this are used without asking the server again
+CACHE_TTL = 30 * 24 * 3600  # seconds
+
+# download(url, path, headers) atomically replaces path with the body and
+# returns the response headers, or returns None if the server answered 304
+Downloader = Callable[[str, Path, Dict[str, str]], Optional[Mapping[str, str]]]
+
+
+class ThumbCache:
+    # on-disk cache of thumbnails keyed by URL; each entry is a blob plus a
+    # small JSON sidecar holding its validators, and the blob's mtime is
+    # its last use for LRU eviction
+    def __init__(
+        self,
+        root: Path = CACHE_DIR,
+        max_bytes: int = CACHE_MAX_BYTES,
+        ttl: float = CACHE_TTL,
+    ) -> None:
+        self.root = Path(root) / "thumbs"
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    def _paths(self, url: str) -> Tuple[Path, Path]:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.root / key, self.root / f"{key}.json"
+
+    def _meta(self, meta_path: Path) -> dict:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_meta(self, meta_path: Path, meta: dict) -> None:
+        # a unique .part file: other threads and runs may save this entry too
+        fd, tmp = tempfile.mkstemp(
+            dir=self.root, prefix=f"{meta_path.name}.", suffix=".part"
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                json.dump(meta, fp)
+            os.replace(tmp, meta_path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def fetch(self, url: str, download: Downloader) -> Path:
+        # path of the cached body of url, downloading or revalidating it
+        # only when needed
+        blob, meta_path = self._paths(url)
+        meta = self._meta(meta_path) if blob.exists() else {}
+
+        if meta and time.time() - meta.get("fetched", 0) < self.ttl:
+            os.utime(blob)
+            return blob
+
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        # a new body replaces the blob (new inode) instead of overwriting it,
+        # so files already linked into an assets directory keep their contents
+        resp_headers = download(url, blob, headers)
+        if resp_headers is None:
+            # 304 Not Modified
+            event(
+                logging.DEBUG,
+                "thumb_unchanged",
+                "Thumbnail %s is unchanged",
+                url,
+                url=url,
+            )
+        else:
+            meta = {
+                "url": url,
+                "etag": resp_headers.get("ETag"),
+                "last_modified": resp_headers.get("Last-Modified"),
+            }
+
+        meta["fetched"] = time.time()
+        self._save_meta(meta_path, meta)
+        os.utime(blob)
+
+        return blob
+
+    def link(self, blob: Path, dest: Path) -> None:
+        # hardlink into the lecture's assets; copy across filesystems
+        dest.unlink(missing_ok=True)
+        try:
+            os.link(blob, dest)
+        except OSError:
+            shutil.copyfile(blob, dest)
+
+    def evict(self) -> int:
+        # drop least recently used entries until the cache fits max_bytes
+        blobs = [p for p in self.root.iterdir() if p.suffix not in (".json", ".part")]
+        stats = {p: p.stat() for p in blobs}
+        total = sum(st.st_size for st in stats.values())
+
+        removed = 0
+        for p in sorted(blobs, key=lambda p: stats[p].st_mtime):
+            if total <= self.max_bytes:
+                break
+            total -= stats[p].st_size
+            p.unlink(missing_ok=True)
+            p.with_name(p.name + ".json").unlink(missing_ok=True)
+            removed += 1
+
+        return removed
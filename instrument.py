@@ -0,0 +1,113 @@
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from cache import part_path
+
+try:
+    import resource
+except ImportError:
+    # not on Windows: CPU of ffmpeg and peak RSS are left out
+    resource = None
+
+
+def _children_cpu() -> float:
+    # CPU seconds of the ffmpeg processes that have exited so far
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _peak_rss_mb() -> float:
+    # high-water mark of this process and of its largest child, so far
+    if resource is None:
+        return 0.0
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def _io_bytes() -> tuple[int, int]:
+    # bytes read and written by this process, reaped children included
+    # (Linux only; zero elsewhere)
+    try:
+        with open("/proc/self/io", "r", encoding="ascii") as fp:
+            fields = dict(line.split(": ") for line in fp.read().splitlines())
+    except OSError:
+        return 0, 0
+    return int(fields["rchar"]), int(fields["wchar"])
+
+
+class RunReport:
+    # wall time, CPU time, peak RSS and I/O of each stage of one lecture.
+    # CPU time is this thread's plus that of the ffmpeg processes; the rest
+    # is process-wide, so lectures running side by side in batch.py share
+    # their figures
+    def __init__(
+        self,
+        profile_dir: str | None = None,
+        stages: list[dict[str, Any]] | None = None,
+    ) -> None:
+        # stages carries on a report begun elsewhere (e.g. in a worker)
+        self.stages: list[dict[str, Any]] = list(stages or [])
+        # cProfile output of the Python stages goes here when set
+        self.profile_dir = profile_dir
+
+    @contextmanager
+    def stage(self, name: str, profile: bool = False) -> Iterator[None]:
+        profiler = None
+        if profile and self.profile_dir:
+            profiler = cProfile.Profile()
+
+        read0, written0 = _io_bytes()
+        children0 = _children_cpu()
+        cpu0 = time.thread_time()
+        start = time.perf_counter()
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                # another thread is profiling (one profiler at a time)
+                profiler = None
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall = time.perf_counter() - start
+            cpu = time.thread_time() - cpu0
+            read, written = _io_bytes()
+
+            self.stages.append(
+                {
+                    "stage": name,
+                    "wall": wall,
+                    "cpu": cpu,
+                    "ffmpeg_cpu": _children_cpu() - children0,
+                    "peak_rss_mb": _peak_rss_mb(),
+                    "read_bytes": read - read0,
+                    "written_bytes": written - written0,
+                }
+            )
+
+            if profiler is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+
+    def save(self, path: str, **info: Any) -> None:
+        report = {
+            **info,
+            "wall": sum(s["wall"] for s in self.stages),
+            "stages": self.stages,
+        }
+        with open(part_path(path), "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+        os.replace(part_path(path), path)
@@ -1,81 +1,239 @@
-from bs4 import BeautifulSoup
+import argparse
+import logging
 import re
 import os
-import subprocess
 import glob
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterator
 from PIL import Image
 
+from cache import (
+    CACHE_MANIFEST,
+    Manifest,
+    file_hash,
+    part_path,
+    value_hash,
+    video_key,
+)
+from dedup import DEDUP_THRESHOLD, dedup_frames, dedup_video, png_hash
+from instrument import RunReport
+from progress import Progress, event, setup_logging
+from pdf import JPEG_QUALITY, EmptyPdfError, write_jpeg_pdf, write_pdf
+from page import PARSERS, LecturePage
+from scenes import SCENE_FPS, SCENE_THRESHOLD, detect_slides
+from video import (
+    SEEK_MODE,
+    SEEK_MODES,
+    clock_to_str,
+    ffmpeg_frame,
+    ffmpeg_frames_batch,
+    iter_frames,
+    iter_jpegs,
+    pyav_frames_batch,
+    set_decoder_threads,
+)
+
 OUTPUT_MD = "output.md"
 OUTPUT_PDF = "slides.pdf"
 ASSETS_DIR = "assets"
+# a lecture is written here, next to its final directory, until it is done
+STAGING_SUFFIX = ".part"
+# per-stage timings of the last run, next to output.md
+OUTPUT_REPORT = "report.json"
+# cProfile output of the Python stages with --profile
+PROFILE_DIR = "profile"
+# everything a run writes into a lecture directory; the saved page and its
+# _files directory, moved in next to them, are the user's and never deleted
+GENERATED = [
+    OUTPUT_MD,
+    OUTPUT_PDF,
+    ASSETS_DIR,
+    CACHE_MANIFEST,
+    OUTPUT_REPORT,
+    PROFILE_DIR,
+]
 
 THUMB_MIN_DIFF = -1
 
+# concurrent ffmpeg processes used for screenshots
+JOBS = os.cpu_count() or 1
 
-def find_html() -> str:
-    # find the only HTML file in the current directory
-    html_files = glob.glob("*.html")
+# "seek": one ffmpeg process per frame, "batch": one ffmpeg run for all,
+# "pyav": decode in-process with PyAV, no subprocesses at all
+EXTRACT_MODES = ["seek", "batch", "pyav"]
+EXTRACT_MODE = "seek"
+
+
+def find_htmls() -> list[str]:
+    # every saved page in the current directory
+    html_files = sorted(glob.glob("*.html"))
     if not html_files:
         raise RuntimeError("No HTML file found.")
+
+    return html_files
+
+
+def find_html() -> str:
+    # find the only HTML file in the current directory
+    html_files = find_htmls()
     if len(html_files) > 1:
         raise RuntimeError("Multiple HTML files found.")
 
     return html_files[0]
 
 
-def find_title(input_html: str) -> str:
+def title_from_html(input_html: str) -> str:
+    return input_html.split(".")[0]
+
+
+def load_page(page: str | LecturePage, parser: str = "auto") -> LecturePage:
+    # accept either a path or an already parsed page
+    if isinstance(page, LecturePage):
+        return page
+    return LecturePage(page, parser)
+
+
+def find_title(page: str | LecturePage) -> str:
     # read the title from the HTML file
     # in content-header-recording-title
-    with open(input_html, "r", encoding="utf-8") as fp:
-        soup = BeautifulSoup(fp, "html.parser")
+    page = load_page(page)
 
-        title_tag = soup.find("title")
-        if title_tag and title_tag.get_text(strip=True):
-            return title_tag.get_text(strip=True)
-        else:
-            raise RuntimeError("No title found in HTML file.")
+    if page.title:
+        return page.title
+    else:
+        raise RuntimeError("No title found in HTML file.")
 
 
-def find_video(title: str) -> tuple[str, str]:
-    # find the directory having title as a substring
+def find_video(title: str, exclude: set[str] | None = None) -> tuple[str, str]:
+    # find the directory having title as a substring; exclude holds the
+    # other lectures' titles, whose output directories are never inputs
     dirs = [d for d in os.listdir() if os.path.isdir(d)]
     if not dirs:
         raise RuntimeError("No directories found.")
 
+    # a browser saves the page's files as "<title>_files", which wins;
+    # otherwise the closest (shortest) name holding the title
+    dirs.sort(key=lambda d: (d != title + "_files", len(d)))
+
+    skip = (exclude or set()) | {title}
+    # with several saved pages, "Lecture 1" is also a substring of
+    # "Lecture 10_files", which belongs to the other lecture
+    longer = [t for t in skip if title in t and t != title]
     for d in dirs:
+        # the output (or staging) directory of an earlier run is not an input
+        if d in skip or d.removesuffix(STAGING_SUFFIX) in skip:
+            continue
+        if any(t in d for t in longer):
+            continue
         if title in d:
             # find the only .mp4 file in the directory
             mp4_files = glob.glob(os.path.join(d, "*.mp4"))
             if not mp4_files:
                 # raise RuntimeError(f"No video file found in directory '{d}'.")
-                print(f"No video file found in directory '{d}'.")
+                event(
+                    logging.WARNING,
+                    "no_video",
+                    "No video file found in directory '%s'.",
+                    d,
+                    dir=d,
+                )
                 return d, ""
             if len(mp4_files) > 1:
                 # raise RuntimeError(f"Multiple video files found in directory '{d}'.")
-                print(
-                    f"Multiple video files found in directory '{d}'. Using the first one."
+                event(
+                    logging.WARNING,
+                    "many_videos",
+                    "Multiple video files found in directory '%s'. "
+                    "Using the first one.",
+                    d,
+                    dir=d,
+                    videos=mp4_files,
                 )
                 return d, mp4_files[0]
 
             return d, mp4_files[0]
 
     # raise RuntimeError("No video file found in any directory.")
-    print("No video file found in any directory.")
+    event(logging.WARNING, "no_video", "No video file found in any directory.")
     return "", ""
 
 
-def prepare_directory(title: str) -> None:
-    # delete previous files
-    if os.path.isdir(title):
-        to_delete = input(f"Directory '{title}' already exists. Delete? (y/n): ")
-        if to_delete.lower() == "y":
-            os.rmdir(title)
+def staging_dir(title: str) -> str:
+    return title + STAGING_SUFFIX
+
+
+def prepare_directory(title: str, existing: str = "resume") -> str | None:
+    # a lecture is built in a staging directory that only takes the title's
+    # name once it is finished, so a crash never leaves a half-written
+    # lecture under the title; returns the staging directory, or None when
+    # the lecture is skipped
+    work = staging_dir(title)
+    if os.path.isdir(title) or os.path.isdir(work):
+        if existing == "skip-existing" and os.path.isdir(title):
+            event(
+                logging.INFO, "skip", "Directory '%s' already exists. Skipping.", title
+            )
+            return None
+
+        if existing == "overwrite":
+            event(logging.INFO, "overwrite", "Deleting the previous '%s'.", title)
+            for d in (title, work):
+                remove_generated(d)
         else:
-            print("Exiting without changes.")
-            return
+            event(
+                logging.INFO,
+                "resume",
+                "Directory '%s' already exists. Resuming.",
+                title,
+            )
+
+        # an interrupted run's staging directory is newer than the finished
+        # one, which stays in place until it is replaced
+        if not os.path.isdir(work):
+            os.rename(title, work)
+
+    os.makedirs(os.path.join(work, ASSETS_DIR), exist_ok=True)
+    return work
+
+
+def remove_generated(out: str) -> None:
+    # delete the outputs of earlier runs, keeping the archived inputs
+    for name in GENERATED:
+        path = os.path.join(out, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+def move_into(src: str, dest: str) -> None:
+    # move src to dest, merging into a directory already there and
+    # replacing its files (e.g. a page saved again into its lecture)
+    if os.path.isdir(src) and os.path.isdir(dest):
+        for name in os.listdir(src):
+            move_into(os.path.join(src, name), os.path.join(dest, name))
+        os.rmdir(src)
+    else:
+        os.replace(src, dest)
+
+
+def publish_directory(work: str, title: str) -> None:
+    # swap the finished staging directory in under the title; a directory
+    # cannot be replaced in one rename, so the old one steps aside first
+    if not os.path.isdir(title):
+        os.rename(work, title)
+        return
 
-    os.makedirs(title, exist_ok=True)
-    os.makedirs(os.path.join(title, ASSETS_DIR), exist_ok=True)
+    old = title + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    os.rename(title, old)
+    # the inputs archived by earlier runs stay with the lecture
+    for name in os.listdir(old):
+        if name not in GENERATED and not os.path.exists(os.path.join(work, name)):
+            os.rename(os.path.join(old, name), os.path.join(work, name))
+    os.rename(work, title)
+    shutil.rmtree(old, ignore_errors=True)
 
 
 def ts_from_clock(clock: str) -> int:
@@ -89,7 +247,7 @@ def ts_from_clock(clock: str) -> int:
         h, m, s = 0, *parts
     else:
         # malformed ‒ skip
-        print("Malformed time format:", clock)
+        event(logging.WARNING, "bad_clock", "Malformed time format: %s", clock)
         raise ValueError("Invalid time format")
 
     return h * 3600 + m * 60 + s
@@ -117,77 +275,86 @@ def ts_from_thumb(label: str) -> int | None:
     return total
 
 
-def clock_to_str(ts: int) -> str:
-    h, r = divmod(ts, 3600)
-    m, s = divmod(r, 60)
-    return f"{h:02}:{m:02}:{s:02}"
-
-
-def extract_subs(input_html: str) -> list[tuple[int, str]]:
-    # read HTML file
-    with open(input_html, "r", encoding="utf-8") as fp:
-        soup = BeautifulSoup(fp, "html.parser")
+def extract_subs(page: str | LecturePage) -> list[tuple[int, str]]:
+    page = load_page(page)
 
     subs: list[tuple[int, str]] = []
-    for row in soup.select("div.transcript-row"):
-        time_div = row.select_one("div.transcript-time")
-        text_div = row.select_one("div.transcript-text")
-        if not (time_div and text_div):
-            continue
-
-        ts = ts_from_clock(time_div.get_text())
-
-        text = text_div.get_text(separator=" ", strip=True)
-        text = " ".join(text.split())
+    for clock, text in page.rows:
+        ts = ts_from_clock(clock)
         subs.append((ts, text))
 
     subs.sort(key=lambda t: t[0])
     return subs
 
 
-def extract_thumb(input_html: str) -> list[int]:
-    # read HTML file
-    with open(input_html, "r", encoding="utf-8") as fp:
-        soup = BeautifulSoup(fp, "html.parser")
-
+def repair_thumbs(raw: list[int | None]) -> list[int]:
+    # UMich may have invalid thumbnail timestamps: one that is not after the
+    # previous thumbnail invalidates the trailing thumbnails it is not after,
+    # and those are then interpolated between their valid neighbours. Each
+    # thumbnail is invalidated and filled at most once, so this is linear.
     thumbs: list[int] = []
-    for thumb in soup.select("div.thumbnail[aria-label]"):
-        ts = ts_from_thumb(str(thumb["aria-label"]))
-        if ts is not None:
-            # UMich may have invalid thumbnail timestamps
-            if thumbs and thumbs[-1] >= ts:
-                print(f"Warning: Invalid thumbnail timestamp {thumbs[-1]} >= {ts}")
-                # replace the previous thumbnail (maybe multiple) with -1
-                for i in range(len(thumbs) - 1, -1, -1):
-                    if thumbs[i] >= ts:
-                        thumbs[i] = -1
-                    else:
-                        break
-
-            thumbs.append(ts)
-        else:
+    invalid = 0
+    for ts in raw:
+        if ts is None:
             # UMich has the first thumnnail at 0:00 without label
             thumbs.append(0)
+            continue
 
-    # impute invalid timestamps
-    for i in range(len(thumbs)):
-        # the first one cannot be -1, so i starts from 1
-
-        if thumbs[i] == -1:
-            num_of_invalid = 0
-            for j in range(i, len(thumbs)):
-                if thumbs[j] == -1:
-                    num_of_invalid += 1
-                else:
-                    break
-            # fill the invalid timestamps with the average of the two closest timestamps
-            for j in range(i, i + num_of_invalid):
-                thumbs[j] = int(
-                    thumbs[i - 1]
-                    + (thumbs[i + num_of_invalid] - thumbs[i - 1])
-                    / (num_of_invalid + 1)
-                    * (j - i + 1)
-                )
+        if thumbs and thumbs[-1] >= ts:
+            invalid += 1
+            event(
+                logging.DEBUG,
+                "invalid_thumb",
+                "Invalid thumbnail timestamp %d >= %d",
+                thumbs[-1],
+                ts,
+                previous=thumbs[-1],
+                ts=ts,
+            )
+            # replace the previous thumbnail (maybe multiple) with -1, stopping
+            # at the first earlier or already invalid one
+            i = len(thumbs) - 1
+            while i >= 0 and thumbs[i] >= ts:
+                thumbs[i] = -1
+                i -= 1
+
+        thumbs.append(ts)
+
+    if invalid:
+        event(
+            logging.WARNING,
+            "invalid_thumbs",
+            "Warning: %d out-of-order thumbnail timestamps, interpolated",
+            invalid,
+            count=invalid,
+        )
+
+    # impute invalid timestamps: a run of them is spread evenly between the
+    # two closest valid timestamps; the last thumbnail is always valid
+    run_start = -1
+    for i, ts in enumerate(thumbs):
+        if ts == -1:
+            if run_start < 0:
+                run_start = i
+            continue
+        if run_start < 0:
+            continue
+
+        # a run at the very start takes the last thumbnail as its left
+        # neighbour (thumbs[-1]), as it always has
+        left = thumbs[run_start - 1]
+        step = (ts - left) / (i - run_start + 1)
+        for j in range(run_start, i):
+            thumbs[j] = int(left + step * (j - run_start + 1))
+        run_start = -1
+
+    return thumbs
+
+
+def extract_thumb(page: str | LecturePage) -> list[int]:
+    page = load_page(page)
+
+    thumbs = repair_thumbs([ts_from_thumb(label) for label in page.thumb_labels])
 
     # (optional) clean thumbnails that are too close to each other
     if THUMB_MIN_DIFF > 0:
@@ -203,11 +370,31 @@ def extract_thumb(input_html: str) -> list[int]:
     return thumbs
 
 
+def find_slides(manifest: Manifest, input_video: str, threshold: float) -> list[int]:
+    # slide changes detected in the video, for pages saved without thumbnails
+    scene_key = {
+        "video": video_key(input_video),
+        "threshold": threshold,
+        "fps": SCENE_FPS,
+    }
+    cached = manifest.get("scenes", scene_key)
+    if cached:
+        return cached["slides"]
+
+    event(logging.INFO, "scenes", "Detecting slide changes in %s", input_video)
+    slides = detect_slides(input_video, threshold)
+    event(logging.INFO, "scenes", "Found %d slides", len(slides), slides=len(slides))
+    manifest.put("scenes", scene_key, [], slides=slides)
+
+    return slides
+
+
 def output_markdown(title: str, subs: list[tuple[int, str]], thumbs: list[int]) -> None:
     # Write result
     thumb_idx = 0
 
-    with open(f"{title}/{OUTPUT_MD}", "w", encoding="utf-8") as out:
+    md_path = os.path.join(title, OUTPUT_MD)
+    with open(part_path(md_path), "w", encoding="utf-8") as out:
         for t, line in subs:
             # write separators for thumbnails
             while thumb_idx < len(thumbs) and thumbs[thumb_idx] <= t:
@@ -216,84 +403,551 @@ def output_markdown(title: str, subs: list[tuple[int, str]], thumbs: list[int])
 
             out.write(f"{line}\n")
 
+    os.replace(part_path(md_path), md_path)
+
+
+def screenshot_path(title: str, idx: int, ts: int) -> str:
+    clock_str = clock_to_str(ts)
+    return os.path.join(
+        title, ASSETS_DIR, f"{idx:04}_{clock_str.replace(':', '-')}.png"
+    )
+
+
+def grab_screenshots(
+    title: str,
+    input_video: str,
+    timestamps: list[int],
+    jobs: int = JOBS,
+    mode: str = EXTRACT_MODE,
+    seek: str = SEEK_MODE,
+) -> list[str]:
+    outputs = [
+        (ts, screenshot_path(title, idx, ts)) for idx, ts in enumerate(timestamps, 1)
+    ]
+
+    # screenshots left by an earlier, interrupted run are kept
+    todo = [(ts, p) for ts, p in outputs if not os.path.exists(p)]
+    if len(todo) < len(outputs):
+        reused = len(outputs) - len(todo)
+        event(
+            logging.INFO,
+            "reuse",
+            "Reusing %d screenshots from a previous run",
+            reused,
+            screenshots=reused,
+        )
 
-def grab_screenshots(title: str, input_video: str, timestamps: list[int]) -> None:
-    for idx, ts in enumerate(timestamps, 1):
-        clock_str = clock_to_str(ts)
+    def shoot() -> Iterator[bool]:
+        # whether each screenshot in todo was saved, in order
+        if mode in ("batch", "pyav"):
+            extract = ffmpeg_frames_batch if mode == "batch" else pyav_frames_batch
+            wanted = [ts for ts, _ in todo]
+            saved = set(extract(input_video, wanted, [p for _, p in todo]))
+            yield from (out_png in saved for _, out_png in todo)
+            return
 
-        out_png = os.path.join(
-            title, ASSETS_DIR, f"{idx:04}_{clock_str.replace(':', '-')}.png"
-        )
+        # ffmpeg does the work, so threads are enough to keep every core busy;
+        # map() yields in submission order, so the log stays deterministic
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            yield from pool.map(lambda job: ffmpeg_frame(input_video, *job, seek), todo)
+
+    with Progress("screenshots", len(todo)) as bar:
+        # wrap the zip: zip stops on todo before wrap counts its last item
+        for (ts, out_png), ok in bar.wrap(zip(todo, shoot())):
+            if ok:
+                event(
+                    logging.DEBUG,
+                    "screenshot",
+                    "Screenshot at %s saved to %s",
+                    clock_to_str(ts),
+                    out_png,
+                    ts=ts,
+                    path=out_png,
+                )
+            else:
+                event(
+                    logging.DEBUG,
+                    "no_frame",
+                    "No frame at %s (past end of video)",
+                    clock_to_str(ts),
+                    ts=ts,
+                )
+
+    return [p for _, p in outputs if os.path.exists(p)]
+
+
+def dedup_screenshots(
+    title: str, timestamps: list[int], pngs: list[str], threshold: int = DEDUP_THRESHOLD
+) -> list[tuple[int, str]]:
+    # (ts, png) of the screenshots left once near-identical consecutive ones
+    # are merged; pngs is what grab_screenshots returned
+    saved = set(pngs)
+    shots = [
+        (ts, screenshot_path(title, idx, ts)) for idx, ts in enumerate(timestamps, 1)
+    ]
+
+    return list(dedup_frames([s for s in shots if s[1] in saved], png_hash, threshold))
 
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-ss",
-            clock_str,
-            "-i",
-            input_video,
-            "-frames:v",
-            "1",
-            out_png,
-        ]
-
-        # Run the command with no output
-        subprocess.run(
-            cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
-        )
-        print(f"Screenshot at {clock_str} saved to {out_png}")
 
+def open_images(paths: list[str]) -> Iterator[Image.Image]:
+    # open lazily, one at a time, closing each once the consumer moves on
+    for p in paths:
+        with Image.open(p) as im:
+            yield im
 
-def images_to_pdf(title: str) -> None:
-    pngs = sorted(glob.glob(os.path.join(title, ASSETS_DIR, "*.png")))
+
+def images_to_pdf(
+    title: str, quality: int = JPEG_QUALITY, pngs: list[str] | None = None
+) -> None:
+    # pngs defaults to every screenshot in the assets directory
+    if pngs is None:
+        pngs = sorted(glob.glob(os.path.join(title, ASSETS_DIR, "*.png")))
     if not pngs:
         raise RuntimeError("No PNG screenshots found to combine.")
 
-    im_list = [Image.open(p).convert("RGB") for p in pngs]
+    pdf_path = os.path.join(title, OUTPUT_PDF)
+
+    event(
+        logging.INFO,
+        "pdf",
+        "Converting %d images to PDF: %s",
+        len(pngs),
+        pdf_path,
+        pages=len(pngs),
+        path=pdf_path,
+    )
+
+    # pages are written as they are read, so memory stays flat
+    with Progress("pdf", len(pngs), "pages") as bar:
+        write_pdf(pdf_path, bar.wrap(open_images(pngs)), quality)
+
+
+def frames_to_pdf(
+    title: str,
+    input_video: str,
+    timestamps: list[int],
+    jobs: int = JOBS,
+    mode: str = EXTRACT_MODE,
+    quality: int = JPEG_QUALITY,
+    jpeg: bool = False,
+    dedup: int | None = None,
+    seek: str = SEEK_MODE,
+) -> list[int]:
+    # decoded frames go straight into the PDF, with no PNG round-trip;
+    # returns the timestamps of the slides that made it into the PDF
+    slides = timestamps
+    if dedup is not None:
+        # near-identical consecutive frames become a single page, decided on
+        # a tiny proxy decode so dropped frames are never decoded in full
+        runs = dedup_video(input_video, timestamps, dedup, mode, jobs, seek)
+        slides = [start for start, _ in runs]
+        timestamps = [shown for _, shown in runs]
 
     pdf_path = os.path.join(title, OUTPUT_PDF)
+    event(
+        logging.INFO,
+        "pdf",
+        "Writing %d frames to PDF: %s",
+        len(timestamps),
+        pdf_path,
+        pages=len(timestamps),
+        path=pdf_path,
+    )
+
+    # timestamps past the end of the video are left out
+    written: list[int] = []
+
+    def kept(frames: Iterator[tuple[int, Any]]) -> Iterator[Any]:
+        for ts, frame in frames:
+            written.append(ts)
+            yield frame
+
+    try:
+        with Progress("pdf", len(timestamps)) as bar:
+            if jpeg:
+                # frames are captured as JPEG and embedded without re-encoding
+                jpegs = iter_jpegs(input_video, timestamps, mode, jobs, quality, seek)
+                count = write_jpeg_pdf(pdf_path, kept(bar.wrap(jpegs)))
+            else:
+                frames = iter_frames(input_video, timestamps, mode, jobs, seek)
+                count = write_pdf(pdf_path, kept(bar.wrap(frames)), quality)
+    except EmptyPdfError as e:
+        raise RuntimeError("No frames could be extracted from the video.") from e
+    if count < len(timestamps):
+        event(
+            logging.WARNING,
+            "short_video",
+            "Only %d frames found (the rest are past the end of the video)",
+            count,
+            frames=count,
+        )
+
+    # the slide of each page, matching the frames to the timestamps in order
+    pages = []
+    i = 0
+    for ts in written:
+        while timestamps[i] != ts:
+            i += 1
+        pages.append(slides[i])
+        i += 1
+
+    return pages
+
+
+def add_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    # options shared by main.py and batch.py
+    arg_parser.add_argument(
+        "--parser",
+        default="auto",
+        choices=["auto", *PARSERS],
+        help="HTML parser backend (default: fastest one installed)",
+    )
+    arg_parser.add_argument(
+        "--whole-page",
+        action="store_true",
+        help="parse the entire HTML file instead of only the transcript and "
+        "thumbnail markup",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=JOBS,
+        help=f"concurrent ffmpeg processes for screenshots (default: {JOBS})",
+    )
+    arg_parser.add_argument(
+        "--extract",
+        default=EXTRACT_MODE,
+        choices=EXTRACT_MODES,
+        help="one ffmpeg process per screenshot (seek), one for all (batch) "
+        "or in-process decoding with PyAV (pyav)",
+    )
+    arg_parser.add_argument(
+        "--seek",
+        default=SEEK_MODE,
+        choices=SEEK_MODES,
+        help="with --extract seek: decode forward from the previous keyframe "
+        "to the exact frame (accurate), take that keyframe (fast), or take "
+        "a keyframe within a second and seek accurately otherwise (hybrid)",
+    )
+    existing = arg_parser.add_mutually_exclusive_group()
+    existing.add_argument(
+        "--resume",
+        dest="existing",
+        action="store_const",
+        const="resume",
+        help="reuse an existing output directory, redoing only stale stages "
+        "(default)",
+    )
+    existing.add_argument(
+        "--overwrite",
+        dest="existing",
+        action="store_const",
+        const="overwrite",
+        help="delete an existing output directory and start over",
+    )
+    existing.add_argument(
+        "--skip-existing",
+        dest="existing",
+        action="store_const",
+        const="skip-existing",
+        help="leave lectures whose output directory exists alone",
+    )
+    arg_parser.set_defaults(existing="resume")
+    arg_parser.add_argument(
+        "-q",
+        "--quiet",
+        action="store_true",
+        help="only print warnings and errors, with no progress bar",
+    )
+    arg_parser.add_argument(
+        "--log-json",
+        metavar="FILE",
+        help="append every event, per-frame ones included, to FILE as JSON lines",
+    )
+    arg_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=f"write cProfile stats of the Python stages to {PROFILE_DIR}/",
+    )
+    arg_parser.add_argument(
+        "--decoder-threads",
+        type=int,
+        metavar="N",
+        help="decoding threads per ffmpeg process, 0 for ffmpeg's default "
+        "(default: the CPU count divided by the decoders running at once)",
+    )
+    arg_parser.add_argument(
+        "--save-assets",
+        action="store_true",
+        help=f"also save every screenshot as a PNG under {ASSETS_DIR}/",
+    )
+    arg_parser.add_argument(
+        "--jpeg",
+        action="store_true",
+        help="capture frames as JPEG and embed them in the PDF as-is "
+        "(ignored with --save-assets)",
+    )
+    arg_parser.add_argument(
+        "--jpeg-quality",
+        type=int,
+        default=JPEG_QUALITY,
+        help=f"JPEG quality of the PDF pages, 1-100 (default: {JPEG_QUALITY})",
+    )
+    arg_parser.add_argument(
+        "--dedup",
+        type=int,
+        nargs="?",
+        const=DEDUP_THRESHOLD,
+        metavar="BITS",
+        help="merge consecutive slides whose perceptual hashes differ in at most "
+        f"BITS bits (default when given: {DEDUP_THRESHOLD})",
+    )
+    arg_parser.add_argument(
+        "--scenes",
+        type=float,
+        nargs="?",
+        const=SCENE_THRESHOLD,
+        metavar="SCORE",
+        help="find slides by scene changes in the video instead of the page's "
+        "thumbnails (done anyway when the page has none); SCORE is the "
+        f"change needed, 0-1 (default when given: {SCENE_THRESHOLD})",
+    )
+
+
+def decoder_threads(args: argparse.Namespace, decoders: int) -> int:
+    # --decoder-threads, or else the cores split evenly between the decoders
+    # running at once, so that they fill the machine without fighting over it
+    if args.decoder_threads is not None:
+        return args.decoder_threads
+    return max(1, JOBS // max(1, decoders))
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(
+        description="Extract the transcript and slides from a saved leccap page."
+    )
+    add_arguments(arg_parser)
+
+    return arg_parser.parse_args(argv)
+
+
+def prepare_lecture(
+    input_html: str, args: argparse.Namespace, exclude: set[str] | None = None
+) -> dict:
+    # the cheap, pure-Python half of a lecture: everything up to output.md
+    # find title and video (must in this order)
+    event(logging.INFO, "input", "Input HTML: %s", input_html, html=input_html)
+
+    title = title_from_html(input_html)
+    event(logging.INFO, "title", "Title: %s", title, title=title)
+
+    input_dir, input_video = find_video(title, exclude)
+    event(logging.INFO, "input", "Input directory: %s", input_dir, dir=input_dir)
+    event(logging.INFO, "input", "Input video: %s", input_video, video=input_video)
+
+    # prepare directory; everything is written to out until the end
+    out = prepare_directory(title, args.existing)
+    if out is None:
+        return {"html": input_html, "title": title, "video": input_video, "skip": True}
+
+    manifest = Manifest(out)
+    report = RunReport(os.path.join(out, PROFILE_DIR) if args.profile else None)
+
+    # the markdown and thumbnail list only depend on the HTML
+    md_path = os.path.join(out, OUTPUT_MD)
+    page_key = {"html": file_hash(input_html), "thumb_min_diff": THUMB_MIN_DIFF}
+    cached = manifest.get("markdown", page_key)
+    if cached:
+        event(logging.INFO, "cached", "%s is up to date", md_path, path=md_path)
+        page_thumbs = cached["thumbs"]
+    else:
+        # parse the HTML once for all extractors
+        with report.stage("parse", profile=True):
+            page = LecturePage(input_html, args.parser, args.whole_page)
+        event(logging.INFO, "parser", "HTML parser: %s", page.parser)
 
-    print(f"Converting {len(im_list)} images to PDF: {pdf_path}")
+        # extract subtitles
+        with report.stage("subs", profile=True):
+            subs = extract_subs(page)
 
-    first, rest = im_list[0], im_list[1:]
-    first.save(pdf_path, save_all=True, append_images=rest)
+        # thumbnails
+        with report.stage("thumbs", profile=True):
+            page_thumbs = extract_thumb(page)
 
+    if cached:
+        md_slides = cached.get("slides", page_thumbs)
+    else:
+        # output markdown
+        with report.stage("markdown", profile=True):
+            output_markdown(out, subs, page_thumbs)
+        manifest.put(
+            "markdown", page_key, [md_path], thumbs=page_thumbs, slides=page_thumbs
+        )
+        md_slides = page_thumbs
+
+    return {
+        "html": input_html,
+        "title": title,
+        "out": out,
+        "dir": input_dir,
+        "video": input_video,
+        "thumbs": page_thumbs,
+        # the separators output.md was written with
+        "md_slides": md_slides,
+        "stages": report.stages,
+    }
+
+
+def finish_lecture(lecture: dict, args: argparse.Namespace) -> dict:
+    # the ffmpeg-heavy half of a lecture: slides.pdf, then tidy up
+    input_html, title = lecture["html"], lecture["title"]
+    if lecture.get("skip"):
+        return {"title": title, "video": lecture["video"], "skipped": True}
+
+    out = lecture["out"]
+    input_dir, input_video = lecture["dir"], lecture["video"]
+    thumbs = lecture["thumbs"]
+
+    manifest = Manifest(out)
+    report = RunReport(
+        os.path.join(out, PROFILE_DIR) if args.profile else None,
+        lecture["stages"],
+    )
+
+    # a page saved without thumbnails has its slides found in the video;
+    # that is a full decode, so it runs here with the ffmpeg work, under the
+    # decoder budget that batch.py only sets up in its main process
+    if input_video and (args.scenes is not None or not thumbs):
+        threshold = SCENE_THRESHOLD if args.scenes is None else args.scenes
+        with report.stage("scenes"):
+            thumbs = find_slides(manifest, input_video, threshold)
+
+    # timestamps of the pages of slides.pdf
+    slides = thumbs
 
-def main() -> None:
-    # find html, title and video (must in this order)
-    input_html = find_html()
-    print(f"Input HTML: {input_html}")
+    if input_video:
+        # the PDF only depends on the thumbnails (not the transcript), the
+        # video and the encoding settings
+        pdf_path = os.path.join(out, OUTPUT_PDF)
+        pdf_key = {
+            "thumbs": value_hash(thumbs),
+            "video": video_key(input_video),
+            "jpeg": args.jpeg and not args.save_assets,
+            "quality": args.jpeg_quality,
+            "dedup": args.dedup,
+            # only seek mode seeks; the others always give the exact frame
+            "seek": args.seek if args.extract == "seek" else None,
+        }
+        cached_pdf = manifest.get("pdf", pdf_key)
+        pdf_fresh = cached_pdf is not None
+
+        if args.save_assets:
+            # screenshots from another video, or seeked another way, cannot
+            # be reused
+            shots_key = {"video": pdf_key["video"], "seek": pdf_key["seek"]}
+            if manifest.get("screenshots", shots_key) is None:
+                for p in glob.glob(os.path.join(out, ASSETS_DIR, "*.png")):
+                    os.remove(p)
+                manifest.put("screenshots", shots_key, [])
+
+            # grab screenshots
+            with report.stage("screenshots"):
+                pngs = grab_screenshots(
+                    out, input_video, thumbs, args.jobs, args.extract, args.seek
+                )
+
+            # convert images to PDF
+            if not pdf_fresh:
+                with report.stage("pdf"):
+                    if args.dedup is not None:
+                        shots = dedup_screenshots(out, thumbs, pngs, args.dedup)
+                        slides = [ts for ts, _ in shots]
+                        pngs = [p for _, p in shots]
+                    images_to_pdf(out, args.jpeg_quality, pngs)
+        elif not pdf_fresh:
+            # decode frames straight into the PDF
+            with report.stage("pdf"):
+                pages = frames_to_pdf(
+                    out,
+                    input_video,
+                    thumbs,
+                    args.jobs,
+                    args.extract,
+                    args.jpeg_quality,
+                    args.jpeg,
+                    args.dedup,
+                    args.seek,
+                )
+            if args.dedup is not None:
+                slides = pages
+
+        if pdf_fresh:
+            event(logging.INFO, "cached", "%s is up to date", pdf_path, path=pdf_path)
+            slides = cached_pdf.get("slides", thumbs)
+        else:
+            manifest.put("pdf", pdf_key, [pdf_path], slides=slides)
+
+    if slides != lecture["md_slides"]:
+        # renumber the separators so that (n) in output.md is page n of the PDF
+        md_path = os.path.join(out, OUTPUT_MD)
+        event(
+            logging.INFO,
+            "renumber",
+            "Renumbering %d slides in %s",
+            len(slides),
+            md_path,
+            slides=len(slides),
+        )
+        with report.stage("renumber", profile=True):
+            page = LecturePage(input_html, args.parser, args.whole_page)
+            subs = extract_subs(page)
+            output_markdown(out, subs, slides)
+        manifest.update("markdown", slides=slides)
+
+    report.save(
+        os.path.join(out, OUTPUT_REPORT),
+        title=title,
+        video=input_video,
+        slides=len(slides),
+    )
+
+    # the finished lecture takes its final name in one rename
+    publish_directory(out, title)
+    event(
+        logging.INFO,
+        "report",
+        "Stage timings written to %s",
+        os.path.join(title, OUTPUT_REPORT),
+    )
 
-    title = input_html.split(".")[0]
-    print(f"Title: {title}")
+    if input_dir:
+        # move HTML and directory to the new directory; a page saved again
+        # after an earlier run is merged into the copy archived then
+        move_into(input_html, os.path.join(title, input_html))
+        move_into(input_dir, os.path.join(title, input_dir))
 
-    input_dir, input_video = find_video(title)
-    print(f"Input directory: {input_dir}")
-    print(f"Input video: {input_video}")
+    return {"title": title, "slides": len(slides), "video": input_video}
 
-    # prepare directory
-    prepare_directory(title)
 
-    # extract subtitles
-    subs = extract_subs(input_html)
+def process_lecture(
+    input_html: str, args: argparse.Namespace, exclude: set[str] | None = None
+) -> dict:
+    return finish_lecture(prepare_lecture(input_html, args, exclude), args)
 
-    # thumbnails
-    thumbs = extract_thumb(input_html)
 
-    # output markdown
-    output_markdown(title, subs, thumbs)
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    setup_logging(args.quiet, args.log_json)
 
-    if input_video:
-        # grab screenshots
-        grab_screenshots(title, input_video, thumbs)
+    # seek mode runs --jobs decoders at once, the other modes just one
+    decoders = args.jobs if args.extract == "seek" else 1
+    set_decoder_threads(decoder_threads(args, decoders))
 
-        # convert images to PDF
-        images_to_pdf(title)
+    # find html
+    input_html = find_html()
 
-    if input_dir:
-        # move HTML and directory to the new directory
-        os.rename(input_html, os.path.join(title, input_html))
-        os.rename(input_dir, os.path.join(title, input_dir))
+    process_lecture(input_html, args)
 
 
 if __name__ == "__main__":
@@ -1,14 +1,29 @@
-from bs4 import BeautifulSoup
+import argparse
+import os
 import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import Dict, List, Mapping, Tuple, Optional
 import requests
+from requests.adapters import HTTPAdapter
+
+from httpcache import CACHE_DIR, CACHE_MAX_BYTES, ThumbCache
+from page import PARSERS, LecturePage
 
 INPUT_HTML = "leccap.html"
 OUTPUT_MD = "output.md"
 ASSETS_DIR = Path("assets")
 THUMB_MIN_DIFF = 60  # seconds
 
+# thumbnail downloads
+DOWNLOAD_WORKERS = 8  # concurrent fetches, and pooled connections per host
+DOWNLOAD_TIMEOUT = 5  # seconds
+DOWNLOAD_RETRIES = 3  # extra attempts after the first one fails
+DOWNLOAD_BACKOFF = 0.5  # seconds, doubled after every failed attempt
+CHUNK_SIZE = 64 * 1024
+
 
 def ts_from_clock(clock: str) -> int:
     parts = [int(p) for p in clock.strip().split(":")]
@@ -57,7 +72,149 @@ def bg_url(style: str) -> Optional[str]:
     return m.group(1) if m else None
 
 
-def main() -> None:
+def make_session(workers: int = DOWNLOAD_WORKERS) -> requests.Session:
+    # one keep-alive connection per worker, reused for every thumbnail
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def retryable(e: requests.RequestException) -> bool:
+    # network errors and 429/5xx are worth another try, other 4xx are not
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        code = e.response.status_code
+        return code == 429 or code >= 500
+    return True
+
+
+def download(
+    session: requests.Session,
+    url: str,
+    path: Path,
+    headers: Optional[Dict[str, str]] = None,
+) -> Optional[Mapping[str, str]]:
+    # stream the body to a .part file, renamed once complete; returns the
+    # response headers, or None on 304 for a conditional request. The .part
+    # file has a unique name, since fetches of one URL by other threads or
+    # by another run sharing the cache write to the same path
+    fd, name = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".part")
+    os.close(fd)
+    tmp = Path(name)
+    try:
+        for attempt in range(DOWNLOAD_RETRIES + 1):
+            try:
+                with session.get(
+                    url, headers=headers, timeout=DOWNLOAD_TIMEOUT, stream=True
+                ) as resp:
+                    if resp.status_code == 304:
+                        return None
+                    resp.raise_for_status()
+                    with open(tmp, "wb") as fp:
+                        for chunk in resp.iter_content(CHUNK_SIZE):
+                            fp.write(chunk)
+                tmp.replace(path)
+                return resp.headers
+            except requests.RequestException as e:
+                if attempt == DOWNLOAD_RETRIES or not retryable(e):
+                    raise
+                delay = DOWNLOAD_BACKOFF * 2**attempt
+                print(f"Retrying {url} in {delay:.1f}s ({e})")
+                time.sleep(delay)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+    # unreachable: the last attempt either returns or raises
+    return None
+
+
+def download_all(
+    items: List[Tuple[str, Path]],
+    workers: int = DOWNLOAD_WORKERS,
+    session: Optional[requests.Session] = None,
+    cache: Optional[ThumbCache] = None,
+) -> int:
+    # fetch every (url, path) not on disk yet, a bounded number at a time;
+    # with a cache, paths are linked to cached bodies and only cache misses
+    # (or stale entries) go to the network
+    todo = [(url, path) for url, path in items if not path.exists()]
+    if not todo:
+        return 0
+
+    own_session = session is None
+    if session is None:
+        session = make_session(workers)
+
+    def fetch(item: Tuple[str, Path]) -> None:
+        url, path = item
+        if cache is None:
+            print(f"Downloading thumbnail from {url} to {path}")
+            download(session, url, path)
+            return
+
+        def get(
+            url: str, blob: Path, headers: Dict[str, str]
+        ) -> Optional[Mapping[str, str]]:
+            print(f"Downloading thumbnail from {url}")
+            return download(session, url, blob, headers)
+
+        cache.link(cache.fetch(url, get), path)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            # list() re-raises the first failure
+            list(pool.map(fetch, todo))
+    finally:
+        if own_session:
+            session.close()
+        if cache is not None:
+            cache.evict()
+
+    return len(todo)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    arg_parser = argparse.ArgumentParser(
+        description="Build a markdown transcript with leccap thumbnails."
+    )
+    arg_parser.add_argument(
+        "--parser",
+        default="auto",
+        choices=["auto", *PARSERS],
+        help="HTML parser backend (default: fastest one installed)",
+    )
+    arg_parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=DOWNLOAD_WORKERS,
+        help=f"concurrent thumbnail downloads (default: {DOWNLOAD_WORKERS})",
+    )
+    arg_parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=CACHE_DIR,
+        help=f"thumbnail cache shared by all lectures (default: {CACHE_DIR})",
+    )
+    arg_parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=CACHE_MAX_BYTES // (1024 * 1024),
+        help="size cap of the thumbnail cache; least recently used entries "
+        "are evicted beyond it",
+    )
+    arg_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always download thumbnails, bypassing the cache",
+    )
+
+    return arg_parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+
     # clean assets dir
     if ASSETS_DIR.exists():
         for p in ASSETS_DIR.iterdir():
@@ -67,21 +224,12 @@ def main() -> None:
         ASSETS_DIR.mkdir(parents=True)
 
     # read HTML file
-    with open(INPUT_HTML, "r", encoding="utf-8") as fp:
-        soup = BeautifulSoup(fp, "html.parser")
+    page = LecturePage(INPUT_HTML, args.parser)
 
     # (timestamp, subtitle) pairs
     subs: list[tuple[int, str]] = []
-    for row in soup.select("div.transcript-row"):
-        time_div = row.select_one("div.transcript-time")
-        text_div = row.select_one("div.transcript-text")
-        if not (time_div and text_div):
-            continue
-
-        ts = ts_from_clock(time_div.get_text())
-
-        text = text_div.get_text(separator=" ", strip=True)
-        text = " ".join(text.split())
+    for clock, text in page.rows:
+        ts = ts_from_clock(clock)
         subs.append((ts, text))
 
     subs.sort(key=lambda t: t[0])
@@ -89,21 +237,15 @@ def main() -> None:
     # thumbnails
     thumbs: List[Tuple[int, str, Path]] = []  # (timestamp, url, local_path)
     thumb_counter = 1
-    for thumb in soup.select("div.thumbnail[aria-label] > div"):
-        parent = thumb.parent
-        if parent is None:
-            continue
-
-        label = str(parent["aria-label"])
+    for label, style in page.thumb_styles:
         ts = ts_from_thumb(label)
         if ts is None:
             continue
 
-        style = thumb.get("style", "")
         if not style:
             continue
 
-        url = bg_url(str(style))
+        url = bg_url(style)
         if not url:
             continue
         if url.startswith("//"):
@@ -125,15 +267,13 @@ def main() -> None:
 
     thumbs = cleaned_thumbs
 
-    # download thumbnails
-    for _, url, path in thumbs:
-        if not path.exists():
-            print(f"Downloading thumbnail from {url} to {path}")
-
-            resp = requests.get(url, timeout=5)
-            resp.raise_for_status()
-            with open(path, "wb") as fp:
-                fp.write(resp.content)
+    # download thumbnails (or link them from the cache)
+    cache = None
+    if not args.no_cache:
+        cache = ThumbCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+    download_all(
+        [(url, path) for _, url, path in thumbs], args.download_workers, cache=cache
+    )
 
     # merge thumbnails into subtitles
     out_lines: List[str] = []
@@ -0,0 +1,504 @@
+import bisect
+import mmap
+import os
+import re
+from html.parser import HTMLParser
+from typing import Any, Iterator
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# characters of HTML fed to the streaming parser at a time
+CHUNK_SIZE = 64 * 1024
+
+# class names of the containers the extractors read; only the part of the
+# page from the first to the end of the last one is decoded and parsed
+REGION_CLASSES = [b"transcript-row", b"thumbnail"]
+
+# parser backends, fastest first; "auto" picks the first one installed
+PARSERS = ["selectolax", "lxml", "stream", "html.parser"]
+
+
+def available_parsers() -> list[str]:
+    found = []
+    for name in PARSERS:
+        if name == "selectolax" and LexborHTMLParser is None:
+            continue
+        if name == "lxml" and lxml is None:
+            continue
+        if name == "html.parser" and BeautifulSoup is None:
+            continue
+        found.append(name)
+
+    return found
+
+
+def pick_parser(name: str = "auto") -> str:
+    found = available_parsers()
+    if name == "auto":
+        return found[0]
+    if name not in PARSERS:
+        raise ValueError(f"Unknown parser '{name}'.")
+    if name not in found:
+        raise RuntimeError(f"Parser '{name}' is not installed.")
+
+    return name
+
+
+def _join_text(strings: Iterator[str]) -> str:
+    # same as bs4 get_text(separator=" ", strip=True) + whitespace collapse
+    return " ".join(" ".join(s.strip() for s in strings if s.strip()).split())
+
+
+_HAS_CLASS = "contains(concat(' ', normalize-space(@class), ' '), ' {} ')"
+
+
+def _lxml_strings(el: Any) -> Iterator[str]:
+    # text nodes under el, skipping comments, scripts and styles
+    if isinstance(el.tag, str) and el.tag not in ("script", "style") and el.text:
+        yield el.text
+    for child in el:
+        yield from _lxml_strings(child)
+        if child.tail:
+            yield child.tail
+
+
+class LecturePage:
+    # a saved leccap page, parsed once and shared by all extractors
+    def __init__(
+        self, input_html: str, parser: str = "auto", whole: bool = False
+    ) -> None:
+        self.path = input_html
+        self.parser = pick_parser(parser)
+        # parse the entire file instead of only the regions of page_regions()
+        self.whole = whole
+
+        # <title> text, empty if missing
+        self.title = ""
+        # (clock, text) pairs in document order
+        self.rows: list[tuple[str, str]] = []
+        # aria-label of every thumbnail in document order
+        self.thumb_labels: list[str] = []
+        # (aria-label, style) of every <div> directly inside a thumbnail
+        self.thumb_styles: list[tuple[str, str]] = []
+
+        if self.parser == "stream":
+            self._load_stream(input_html)
+            return
+
+        if whole:
+            with open(input_html, "r", encoding="utf-8") as fp:
+                html = fp.read()
+        else:
+            html = "\n".join(page_regions(input_html))
+
+        if self.parser == "selectolax":
+            self._load_selectolax(html)
+        elif self.parser == "lxml":
+            self._load_lxml(html)
+        else:
+            self._load_soup(html)
+
+    def _load_stream(self, input_html: str) -> None:
+        for kind, value in stream_page(input_html, whole=self.whole):
+            if kind == "title":
+                self.title = value
+            elif kind == "row":
+                self.rows.append(value)
+            elif kind == "thumb":
+                self.thumb_labels.append(value)
+            elif kind == "thumb_style":
+                self.thumb_styles.append(value)
+
+    def _load_soup(self, html: str) -> None:
+        soup = BeautifulSoup(html, "html.parser")
+
+        title_tag = soup.find("title")
+        if title_tag:
+            self.title = title_tag.get_text(strip=True)
+
+        for row in soup.select("div.transcript-row"):
+            time_div = row.select_one("div.transcript-time")
+            text_div = row.select_one("div.transcript-text")
+            if not (time_div and text_div):
+                continue
+
+            text = text_div.get_text(separator=" ", strip=True)
+            text = " ".join(text.split())
+            self.rows.append((time_div.get_text(), text))
+
+        for thumb in soup.select("div.thumbnail[aria-label]"):
+            self.thumb_labels.append(str(thumb["aria-label"]))
+
+        for thumb in soup.select("div.thumbnail[aria-label] > div"):
+            label = str(thumb.parent["aria-label"])
+            self.thumb_styles.append((label, str(thumb.get("style", ""))))
+
+    def _load_lxml(self, html: str) -> None:
+        if not html.strip():
+            # lxml refuses an empty document
+            return
+        root = lxml.html.document_fromstring(html)
+
+        title_tag = root.find(".//title")
+        if title_tag is not None:
+            self.title = "".join(s.strip() for s in _lxml_strings(title_tag))
+
+        row_xp = f"//div[{_HAS_CLASS.format('transcript-row')}]"
+        time_xp = f".//div[{_HAS_CLASS.format('transcript-time')}]"
+        text_xp = f".//div[{_HAS_CLASS.format('transcript-text')}]"
+        for row in root.xpath(row_xp):
+            time_divs = row.xpath(time_xp)
+            text_divs = row.xpath(text_xp)
+            if not (time_divs and text_divs):
+                continue
+
+            clock = "".join(_lxml_strings(time_divs[0]))
+            self.rows.append((clock, _join_text(_lxml_strings(text_divs[0]))))
+
+        thumb_xp = f"//div[{_HAS_CLASS.format('thumbnail')} and @aria-label]"
+        for thumb in root.xpath(thumb_xp):
+            label = thumb.get("aria-label")
+            self.thumb_labels.append(label)
+            for child in thumb.iterchildren("div"):
+                self.thumb_styles.append((label, child.get("style", "")))
+
+    def _load_selectolax(self, html: str) -> None:
+        tree = LexborHTMLParser(html)
+
+        # bs4 leaves script and style contents out of get_text()
+        tree.strip_tags(["script", "style"])
+
+        title_tag = tree.css_first("title")
+        if title_tag is not None:
+            self.title = title_tag.text(strip=True)
+
+        for row in tree.css("div.transcript-row"):
+            time_div = row.css_first("div.transcript-time")
+            text_div = row.css_first("div.transcript-text")
+            if time_div is None or text_div is None:
+                continue
+
+            text = text_div.text(deep=True, separator=" ", strip=True)
+            self.rows.append((time_div.text(deep=True), " ".join(text.split())))
+
+        for thumb in tree.css("div.thumbnail[aria-label]"):
+            label = thumb.attributes["aria-label"] or ""
+            self.thumb_labels.append(label)
+            for child in thumb.iter():
+                if child.tag == "div":
+                    style = child.attributes.get("style") or ""
+                    self.thumb_styles.append((label, style))
+
+
+class PageStreamParser(HTMLParser):
+    # emits ("title", text), ("row", (clock, text)), ("thumb", label) and
+    # ("thumb_style", (label, style)) events while the HTML is fed in, only
+    # ever holding the current row
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.events: list[tuple[str, Any]] = []
+
+        # one entry per open <div>: its role, or "" if not interesting
+        self._divs: list[str] = []
+        self._skip = 0  # depth inside <script>/<style>
+
+        self._title_done = False
+        self._in_title = False
+        self._title: list[str] = []
+
+        self._thumb_label = ""
+
+        self._in_row = False
+        self._time: list[str] | None = None
+        self._text: list[str] | None = None
+        # which capture the data currently goes to ("time", "text" or "")
+        self._target = ""
+
+    def _boundary(self) -> None:
+        # text on either side of a tag is a separate string, like in bs4
+        if self._in_title:
+            self._title.append("")
+        if self._target == "time" and self._time is not None:
+            self._time.append("")
+        elif self._target == "text" and self._text is not None:
+            self._text.append("")
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        self._boundary()
+
+        if tag in ("script", "style"):
+            self._skip += 1
+            return
+        if tag == "title" and not self._title_done:
+            self._in_title = True
+            self._title = [""]
+            return
+        if tag != "div":
+            return
+
+        attr = dict(attrs)
+        classes = (attr.get("class") or "").split()
+
+        role = ""
+        if self._divs and self._divs[-1] == "thumb":
+            style = attr.get("style") or ""
+            self.events.append(("thumb_style", (self._thumb_label, style)))
+
+        if "thumbnail" in classes and "aria-label" in attr:
+            self._thumb_label = attr["aria-label"] or ""
+            self.events.append(("thumb", self._thumb_label))
+            if not self._in_row:
+                role = "thumb"
+        elif "transcript-row" in classes and not self._in_row:
+            role = "row"
+            self._in_row = True
+            self._time = None
+            self._text = None
+        elif self._in_row and not self._target:
+            if "transcript-time" in classes and self._time is None:
+                role = "time"
+                self._time = [""]
+            elif "transcript-text" in classes and self._text is None:
+                role = "text"
+                self._text = [""]
+            self._target = role
+
+        self._divs.append(role)
+
+    def handle_endtag(self, tag: str) -> None:
+        self._boundary()
+
+        if tag in ("script", "style"):
+            self._skip = max(0, self._skip - 1)
+            return
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            self._title_done = True
+            self.events.append(("title", "".join(s.strip() for s in self._title)))
+            return
+        if tag != "div" or not self._divs:
+            return
+
+        role = self._divs.pop()
+        if role in ("time", "text"):
+            self._target = ""
+        elif role == "row":
+            self._in_row = False
+            self._target = ""
+            if self._time is not None and self._text is not None:
+                clock = "".join(self._time)
+                text = " ".join(s.strip() for s in self._text if s.strip())
+                text = " ".join(text.split())
+                self.events.append(("row", (clock, text)))
+            self._time = None
+            self._text = None
+
+    def handle_comment(self, data: str) -> None:
+        self._boundary()
+
+    def handle_data(self, data: str) -> None:
+        if self._skip:
+            return
+        if self._in_title:
+            self._title[-1] += data
+        if self._target == "time" and self._time is not None:
+            self._time[-1] += data
+        elif self._target == "text" and self._text is not None:
+            self._text[-1] += data
+
+
+def _read_chunks(input_html: str, chunk_size: int) -> Iterator[str]:
+    with open(input_html, "r", encoding="utf-8") as fp:
+        while chunk := fp.read(chunk_size):
+            yield chunk
+
+
+def stream_page(
+    input_html: str, chunk_size: int = CHUNK_SIZE, whole: bool = False
+) -> Iterator[tuple[str, Any]]:
+    # yield page events as the file is read, never building a DOM; unless
+    # whole, only the regions of page_regions() are read
+    parser = PageStreamParser()
+    if whole:
+        chunks = _read_chunks(input_html, chunk_size)
+    else:
+        chunks = page_regions(input_html)
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.events
+        parser.events.clear()
+
+    parser.close()
+    yield from parser.events
+    parser.events.clear()
+
+
+# a <div> start or end tag; attribute values may hold ">" when quoted
+_DIV_TAG_RE = re.compile(
+    rb"""<(/?)div(?=[\s/>])(?:[^>"']|"[^"]*"|'[^']*')*>""", re.IGNORECASE
+)
+# one attribute of a start tag: name, then the value in one of its forms
+_ATTR_RE = re.compile(
+    rb"""([^\s"'=<>/]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))?"""
+)
+# where markup stops being markup: a comment, or a <script> or <style>
+_SKIP_RE = re.compile(rb"<(?:!--|(script|style)(?=[\s/>]))", re.IGNORECASE)
+_SKIP_END_RE = {
+    b"script": re.compile(rb"</script(?=[\s/>])", re.IGNORECASE),
+    b"style": re.compile(rb"</style(?=[\s/>])", re.IGNORECASE),
+}
+_TITLE_RE = re.compile(rb"<title(?=[\s/>])", re.IGNORECASE)
+_TITLE_END_RE = re.compile(rb"</title\s*>", re.IGNORECASE)
+
+
+def _skipped_spans(buf: mmap.mmap) -> list[tuple[int, int]]:
+    # (start, end) of every comment, <script> and <style> element, in
+    # order; a class name in there is text or code, not markup
+    spans = []
+    pos = 0
+    while m := _SKIP_RE.search(buf, pos):
+        if m.group(1) is None:
+            close = buf.find(b"-->", m.end())
+            end = close + 3 if close != -1 else len(buf)
+        else:
+            close_m = _SKIP_END_RE[m.group(1).lower()].search(buf, m.end())
+            close = buf.find(b">", close_m.end()) if close_m else -1
+            end = close + 1 if close != -1 else len(buf)
+        spans.append((m.start(), end))
+        pos = end
+
+    return spans
+
+
+class _Markup:
+    # a mapped page and its skipped spans, to tell markup from the rest
+    def __init__(self, buf: mmap.mmap) -> None:
+        self.buf = buf
+        self.spans = _skipped_spans(buf)
+        self.starts = [start for start, _ in self.spans]
+
+    def skipped(self, pos: int) -> int:
+        # end of the skipped span holding pos, or -1 if pos is markup
+        i = bisect.bisect_right(self.starts, pos) - 1
+        if i >= 0 and pos < self.spans[i][1]:
+            return self.spans[i][1]
+        return -1
+
+    def search(self, pattern: re.Pattern, pos: int = 0) -> re.Match | None:
+        # first match of pattern in markup
+        while m := pattern.search(self.buf, pos):
+            end = self.skipped(m.start())
+            if end == -1:
+                return m
+            pos = end
+        return None
+
+    def div_with_class(self, pos: int, name: bytes) -> int:
+        # start of the <div> tag whose class attribute contains name at pos,
+        # or -1 if pos is anywhere else (text, another tag, a longer name);
+        # a "<" before pos may sit in a quoted value, so earlier ones are
+        # tried up to the first <div
+        start = pos
+        while (start := self.buf.rfind(b"<", 0, start)) != -1:
+            m = _DIV_TAG_RE.match(self.buf, start)
+            if m is not None and not m.group(1):
+                break
+        else:
+            return -1
+        if m.end() <= pos:
+            return -1
+
+        for attr in _ATTR_RE.finditer(m.group(0), 4):
+            if attr.group(1).lower() == b"class":
+                value = attr.group(2) or attr.group(3) or attr.group(4) or b""
+                return start if name in value.split() else -1
+
+        return -1
+
+    def div_end(self, start: int) -> int:
+        # end of the </div> closing the <div> tag at start
+        depth = 0
+        pos = start
+        while m := self.search(_DIV_TAG_RE, pos):
+            depth += -1 if m.group(1) else 1
+            if depth == 0:
+                return m.end()
+            pos = m.end()
+
+        return len(self.buf)
+
+    def class_span(self, name: bytes) -> tuple[int, int] | None:
+        # from the first <div> of class name to the end of the last one
+        first = last = -1
+        pos = 0
+        while (hit := self.buf.find(name, pos)) != -1:
+            end = self.skipped(hit)
+            if end != -1:
+                # jump over the comment, script or style
+                pos = end
+                continue
+
+            tag = self.div_with_class(hit, name)
+            if tag != -1:
+                if first == -1:
+                    first = tag
+                last = tag
+            pos = hit + len(name)
+
+        if first == -1:
+            return None
+        return first, self.div_end(last)
+
+
+def find_regions(buf: mmap.mmap) -> list[tuple[int, int]]:
+    # byte ranges of the page that hold the <title>, the transcript rows and
+    # the thumbnails, in document order; everything else (inlined bundles,
+    # base64 images) lies outside and is never decoded
+    markup = _Markup(buf)
+    spans = []
+
+    title = markup.search(_TITLE_RE)
+    if title is not None:
+        close = _TITLE_END_RE.search(buf, title.end())
+        spans.append((title.start(), close.end() if close else len(buf)))
+
+    for name in REGION_CLASSES:
+        span = markup.class_span(name)
+        if span is not None:
+            spans.append(span)
+
+    regions: list[tuple[int, int]] = []
+    for start, end in sorted(spans):
+        if regions and start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+        else:
+            regions.append((start, end))
+
+    return regions
+
+
+def page_regions(input_html: str) -> Iterator[str]:
+    # the text of find_regions(), decoded straight from a memory map of the
+    # file: memory and time follow the size of the transcript, not the page
+    with open(input_html, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            # an empty file cannot be mapped
+            return
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for start, end in find_regions(buf):
+                with memoryview(buf)[start:end] as view:
+                    text = str(view, "utf-8")
+                yield text
@@ -0,0 +1,142 @@
+import io
+import os
+from typing import Iterable
+from PIL import Image
+
+from cache import part_path
+
+# quality PIL uses when it JPEG-encodes RGB pages itself
+JPEG_QUALITY = 75
+
+
+class EmptyPdfError(RuntimeError):
+    # closing a writer that has no pages; the previous PDF is left in place
+    pass
+
+
+class PdfWriter:
+    # writes one page per image straight to disk; only the page being added
+    # and the object offsets are ever held in memory. The file only appears
+    # under pdf_path once it is complete.
+    def __init__(self, pdf_path: str) -> None:
+        self.pdf_path = pdf_path
+        self.fp = open(part_path(pdf_path), "wb")
+        self.fp.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+        # object 1 is the catalog and 2 the page tree, both written at close
+        self.offsets: dict[int, int] = {}
+        self.pages: list[int] = []
+        self.next_obj = 3
+
+    def __enter__(self) -> "PdfWriter":
+        return self
+
+    def __exit__(self, exc_type: object, *exc: object) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def _alloc(self) -> int:
+        num = self.next_obj
+        self.next_obj += 1
+        return num
+
+    def _obj(self, num: int, body: str, stream: bytes | None = None) -> None:
+        self.offsets[num] = self.fp.tell()
+        self.fp.write(f"{num} 0 obj\n".encode())
+        if stream is None:
+            self.fp.write(f"{body}\nendobj\n".encode())
+        else:
+            self.fp.write(f"<< {body} /Length {len(stream)} >>\nstream\n".encode())
+            self.fp.write(stream)
+            self.fp.write(b"\nendstream\nendobj\n")
+
+    def add_jpeg(
+        self, data: bytes, width: int, height: int, gray: bool = False
+    ) -> None:
+        # embed already-encoded JPEG bytes as a DCTDecode page, 1px = 1pt
+        image, content, page = self._alloc(), self._alloc(), self._alloc()
+
+        colors = "/DeviceGray" if gray else "/DeviceRGB"
+        self._obj(
+            image,
+            f"/Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {colors} /BitsPerComponent 8 /Filter /DCTDecode",
+            data,
+        )
+        self._obj(content, "", f"q {width} 0 0 {height} 0 0 cm /Im0 Do Q".encode())
+
+        procset = "/ImageB" if gray else "/ImageC"
+        self._obj(
+            page,
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+            f"/Resources << /XObject << /Im0 {image} 0 R >> "
+            f"/ProcSet [/PDF {procset}] >> /Contents {content} 0 R >>",
+        )
+        self.pages.append(page)
+
+    def add_image(self, im: Image.Image, quality: int = JPEG_QUALITY) -> None:
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+
+        buf = io.BytesIO()
+        im.save(buf, "JPEG", quality=quality)
+        self.add_jpeg(buf.getvalue(), im.width, im.height, gray=im.mode == "L")
+
+    def close(self) -> None:
+        if self.fp.closed:
+            return
+        if not self.pages:
+            # a PDF with no pages must not replace one that has some
+            self.abort()
+            raise EmptyPdfError(f"No pages to write to {self.pdf_path}.")
+
+        kids = " ".join(f"{p} 0 R" for p in self.pages)
+        self._obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>")
+        self._obj(1, "<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref = self.fp.tell()
+        size = self.next_obj
+        self.fp.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for num in range(1, size):
+            self.fp.write(f"{self.offsets[num]:010} 00000 n \n".encode())
+        self.fp.write(
+            f"trailer\n<< /Size {size} /Root 1 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n".encode()
+        )
+        self.fp.close()
+        os.replace(self.fp.name, self.pdf_path)
+
+    def abort(self) -> None:
+        # drop the partial file, leaving any previous PDF untouched
+        self.fp.close()
+        if os.path.exists(self.fp.name):
+            os.remove(self.fp.name)
+
+
+def write_pdf(
+    pdf_path: str, images: Iterable[Image.Image], quality: int = JPEG_QUALITY
+) -> int:
+    # images may be a lazy iterator; each one is released once written
+    count = 0
+    with PdfWriter(pdf_path) as pdf:
+        for im in images:
+            pdf.add_image(im, quality)
+            count += 1
+
+    return count
+
+
+def write_jpeg_pdf(pdf_path: str, jpegs: Iterable[bytes]) -> int:
+    # JPEG bytes are embedded as-is (DCTDecode), with no decode or re-encode
+    count = 0
+    with PdfWriter(pdf_path) as pdf:
+        for data in jpegs:
+            # only the header is parsed to learn the size
+            with Image.open(io.BytesIO(data)) as im:
+                width, height, gray = im.width, im.height, im.mode == "L"
+            pdf.add_jpeg(data, width, height, gray)
+            count += 1
+
+    return count
@@ -0,0 +1,165 @@
+import json
+import logging
+import sys
+import threading
+import time
+from typing import Any, Iterable, Iterator, TextIO, TypeVar
+
+# every message of the pipeline goes through this logger as a record with
+# an event name and fields, so a --log-json file can be parsed afterwards
+log = logging.getLogger("leccap")
+
+T = TypeVar("T")
+
+# the status line is redrawn at most this often (seconds)
+REDRAW_INTERVAL = 0.1
+
+
+def event(level: int, name: str, msg: str, *args: Any, **fields: Any) -> None:
+    # msg is %-formatted with args only if some handler takes the record
+    log.log(level, msg, *args, extra={"event": name, "fields": fields})
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(
+            {
+                "time": record.created,
+                "level": record.levelname,
+                "event": getattr(record, "event", None),
+                "message": record.getMessage(),
+                **getattr(record, "fields", {}),
+            },
+            default=str,
+        )
+
+
+class StatusLine:
+    # the one progress bar on the terminal, summing every task in flight
+    # (e.g. several lectures of batch.py); log lines are printed above it
+    def __init__(self) -> None:
+        self.stream: TextIO | None = None
+        self.lock = threading.RLock()
+        self.tasks: list[Progress] = []
+        self.drawn = False
+        self.last = 0.0
+
+    def clear(self) -> None:
+        with self.lock:
+            if self.drawn and self.stream is not None:
+                self.stream.write("\r\033[K")
+                self.stream.flush()
+                self.drawn = False
+
+    def draw(self, force: bool = False) -> None:
+        if self.stream is None:
+            return
+        with self.lock:
+            now = time.perf_counter()
+            if not force and now - self.last < REDRAW_INTERVAL:
+                return
+            self.last = now
+
+            self.clear()
+            if not self.tasks:
+                return
+
+            done = sum(t.done for t in self.tasks)
+            total = sum(t.total for t in self.tasks)
+            start = min(t.start for t in self.tasks)
+            rate = done / max(now - start, 1e-9)
+            eta = (total - done) / rate if rate else 0.0
+
+            width = 30
+            filled = width * done // max(total, 1)
+            labels = ", ".join(dict.fromkeys(t.label for t in self.tasks))
+            self.stream.write(
+                f"[{'#' * filled}{'.' * (width - filled)}] {done}/{total} "
+                f"{rate:.1f} {self.tasks[0].unit}/s ETA {eta:.0f}s  {labels}"
+            )
+            self.stream.flush()
+            self.drawn = True
+
+
+_status = StatusLine()
+
+
+class ConsoleHandler(logging.StreamHandler):
+    # plain messages, printed above the status line
+    def emit(self, record: logging.LogRecord) -> None:
+        with _status.lock:
+            _status.clear()
+            super().emit(record)
+            _status.draw(force=True)
+
+
+class Progress:
+    # a counted task on the status line; when it is closed a one-line
+    # summary with its throughput is logged
+    def __init__(self, label: str, total: int, unit: str = "frames") -> None:
+        self.label = label
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.start = time.perf_counter()
+
+    def __enter__(self) -> "Progress":
+        with _status.lock:
+            _status.tasks.append(self)
+        _status.draw(force=True)
+        return self
+
+    def advance(self, n: int = 1) -> None:
+        self.done += n
+        _status.draw()
+
+    def wrap(self, items: Iterable[T]) -> Iterator[T]:
+        # count items as the consumer takes them
+        for item in items:
+            yield item
+            self.advance()
+
+    def __exit__(self, *exc: Any) -> None:
+        with _status.lock:
+            _status.tasks.remove(self)
+            _status.draw(force=True)
+        if not self.total:
+            return
+
+        seconds = time.perf_counter() - self.start
+        event(
+            logging.INFO,
+            "progress",
+            "%s: %d/%d %s in %.1fs (%.1f %s/s)",
+            self.label,
+            self.done,
+            self.total,
+            self.unit,
+            seconds,
+            self.done / max(seconds, 1e-9),
+            self.unit,
+            label=self.label,
+            done=self.done,
+            total=self.total,
+            seconds=seconds,
+        )
+
+
+def setup_logging(quiet: bool = False, log_json: str | None = None) -> None:
+    # messages to stdout (warnings only with quiet), a status line on stderr
+    # when it is a terminal, and every event as JSON lines to log_json
+    log.handlers.clear()
+    log.propagate = False
+    log.setLevel(logging.DEBUG if log_json else logging.INFO)
+
+    console = ConsoleHandler(sys.stdout)
+    console.setLevel(logging.WARNING if quiet else logging.INFO)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(console)
+
+    if log_json:
+        file_handler = logging.FileHandler(log_json, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        log.addHandler(file_handler)
+
+    _status.stream = sys.stderr if not quiet and sys.stderr.isatty() else None
@@ -0,0 +1,66 @@
+import math
+import re
+import subprocess
+
+from video import decoder_args, decoder_slot
+
+# the scene score is the mean absolute difference of two consecutive
+# analysed frames, 0-1; a new slide on the same template only changes a
+# few percent of the picture, so this leans towards catching every change
+SCENE_THRESHOLD = 0.05
+# frames analysed per second of video; slides stay up for seconds, so a
+# couple of samples a second find every change to within half a second
+SCENE_FPS = 2
+# width of the analysed frames; the score is an average, so a thumbnail
+# gives the same answer as the full frame for a fraction of the work
+SCENE_WIDTH = 160
+
+_PTS_RE = re.compile(rb"pts_time:(\d+(?:\.\d+)?)")
+
+
+def scene_cmd(input_video: str, threshold: float, fps: int, width: int) -> list[str]:
+    # one low-resolution pass over the video; the select filter keeps the
+    # frames that start a new scene and metadata prints their time to stdout
+    filters = [
+        f"fps={fps}",
+        f"scale={width}:-2:flags=fast_bilinear",
+        "format=gray",
+        f"select='gt(scene,{threshold})'",
+        "metadata=print:file=-",
+    ]
+    return [
+        "ffmpeg",
+        "-nostats",
+        *decoder_args(),
+        "-i",
+        input_video,
+        "-vf",
+        ",".join(filters),
+        "-f",
+        "null",
+        "-",
+    ]
+
+
+def detect_slides(
+    input_video: str,
+    threshold: float = SCENE_THRESHOLD,
+    fps: int = SCENE_FPS,
+    width: int = SCENE_WIDTH,
+) -> list[int]:
+    # timestamps (whole seconds, increasing) at which a new slide is up;
+    # the first slide is the one showing at 0
+    cmd = scene_cmd(input_video, threshold, fps, width)
+    with decoder_slot():
+        proc = subprocess.run(
+            cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+
+    slides = [0]
+    for m in _PTS_RE.finditer(proc.stdout):
+        # round up so that the frame grabbed at ts already shows the change
+        ts = math.ceil(float(m.group(1)))
+        if ts > slides[-1]:
+            slides.append(ts)
+
+    return slides
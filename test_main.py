@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from main import repair_thumbs  # noqa: E402
+
+
+def baseline_repair(raw: list[int | None]) -> list[int]:
+    # the quadratic loop extract_thumb used before repair_thumbs
+    thumbs: list[int] = []
+    for ts in raw:
+        if ts is not None:
+            if thumbs and thumbs[-1] >= ts:
+                for i in range(len(thumbs) - 1, -1, -1):
+                    if thumbs[i] >= ts:
+                        thumbs[i] = -1
+                    else:
+                        break
+            thumbs.append(ts)
+        else:
+            thumbs.append(0)
+
+    for i in range(len(thumbs)):
+        if thumbs[i] == -1:
+            num_of_invalid = 0
+            for j in range(i, len(thumbs)):
+                if thumbs[j] == -1:
+                    num_of_invalid += 1
+                else:
+                    break
+            for j in range(i, i + num_of_invalid):
+                thumbs[j] = int(
+                    thumbs[i - 1]
+                    + (thumbs[i + num_of_invalid] - thumbs[i - 1])
+                    / (num_of_invalid + 1)
+                    * (j - i + 1)
+                )
+
+    return thumbs
+
+
+DECKS = {
+    "empty": [],
+    "valid": [None, 10, 20, 30, 40],
+    # the first thumbnails are invalidated, so the run wraps to the last one
+    "leading": [50, 60, 70, 10, 20, 30],
+    "leading_unlabelled": [None, 0, 0, 5, 15],
+    # a falling tail invalidates every thumbnail before it in turn
+    "trailing": [10, 20, 30, 40, 35, 25, 15],
+    "falling": [90, 80, 70, 60, 50, 40, 30, 20, 10],
+    "repeats": [None, 10, 10, 10, 20, 20, 30],
+    "several_runs": [0, 30, 20, 40, 70, 60, 50, 80, 100, 90],
+    "both_ends": [40, 50, 10, 20, 30, 100, 90, 80],
+}
+
+
+@pytest.mark.parametrize("name", sorted(DECKS))
+def test_repair_matches_baseline(name):
+    raw = DECKS[name]
+    assert repair_thumbs(list(raw)) == baseline_repair(list(raw))
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_repair_matches_baseline_random(seed):
+    rng = random.Random(seed)
+    # mostly increasing decks with some backwards jumps and missing labels
+    raw: list[int | None] = []
+    ts = rng.randrange(0, 100)
+    for _ in range(rng.randrange(1, 40)):
+        if rng.random() < 0.1:
+            raw.append(None)
+            continue
+        ts = max(0, ts + rng.randrange(-60, 60))
+        raw.append(ts)
+
+    assert repair_thumbs(list(raw)) == baseline_repair(list(raw))
@@ -0,0 +1,133 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import markdown
+from httpcache import ThumbCache
+
+# larger than markdown.CHUNK_SIZE, so the body arrives in several chunks
+BODY = bytes(range(256)) * 1024
+ETAG = '"v1"'
+
+
+class Handler(BaseHTTPRequestHandler):
+    # /flaky answers 503 to its first request, /missing is always 404, and
+    # everything else is BODY with an ETag, or 304 when it is sent back
+    def do_GET(self) -> None:
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            hits = server.hits[self.path]
+
+        if self.path == "/flaky" and hits == 1:
+            self.reply(503)
+            return
+        if self.path == "/missing":
+            self.reply(404)
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.reply(304)
+            return
+
+        self.reply(200)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.send_header("ETag", ETAG)
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def reply(self, code: int) -> None:
+        # every request is recorded with its headers and the status sent
+        with self.server.lock:
+            self.server.requests.append((self.path, dict(self.headers), code))
+        if code >= 400:
+            self.send_error(code)
+        else:
+            self.send_response(code)
+        if code == 304:
+            self.end_headers()
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.lock = threading.Lock()
+    httpd.hits = {}
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(markdown, "DOWNLOAD_BACKOFF", 0.0)
+
+
+def url(server, path: str) -> str:
+    return f"http://127.0.0.1:{server.server_port}{path}"
+
+
+def test_download_streams_body(server, tmp_path):
+    path = tmp_path / "thumb.jpg"
+    with requests.Session() as session:
+        headers = markdown.download(session, url(server, "/thumb"), path)
+
+    assert path.read_bytes() == BODY
+    assert headers["ETag"] == ETAG
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_download_retries_server_errors(server, tmp_path):
+    path = tmp_path / "thumb.jpg"
+    with requests.Session() as session:
+        markdown.download(session, url(server, "/flaky"), path)
+
+    assert path.read_bytes() == BODY
+    assert server.hits["/flaky"] == 2
+
+
+def test_download_gives_up_on_client_errors(server, tmp_path):
+    path = tmp_path / "thumb.jpg"
+    with requests.Session() as session:
+        with pytest.raises(requests.HTTPError):
+            markdown.download(session, url(server, "/missing"), path)
+
+    assert server.hits["/missing"] == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cache_revalidates_with_etag(server, tmp_path):
+    # a zero TTL makes every fetch ask the server again
+    cache = ThumbCache(tmp_path / "cache", ttl=0)
+    items = [(url(server, "/thumb"), tmp_path / "a.jpg")]
+    assert markdown.download_all(items, cache=cache) == 1
+    blob = next(p for p in cache.root.iterdir() if p.suffix != ".json")
+    inode = blob.stat().st_ino
+
+    again = [(url(server, "/thumb"), tmp_path / "b.jpg")]
+    assert markdown.download_all(again, cache=cache) == 1
+
+    (_, first, status), (_, second, revalidated) = server.requests
+    assert status == 200 and "If-None-Match" not in first
+    assert second.get("If-None-Match") == ETAG
+    assert revalidated == 304
+    # a 304 keeps the cached body: the blob is the same file as before
+    assert blob.stat().st_ino == inode
+    assert (tmp_path / "b.jpg").read_bytes() == BODY
+
+
+def test_shared_url_downloads_concurrently(server, tmp_path):
+    cache = ThumbCache(tmp_path / "cache")
+    items = [(url(server, "/thumb"), tmp_path / f"{n}.jpg") for n in range(8)]
+
+    assert markdown.download_all(items, workers=8, cache=cache) == 8
+    assert all(path.read_bytes() == BODY for _, path in items)
+    # no temporary file is left behind
+    assert not list((tmp_path / "cache" / "thumbs").glob("*.part"))
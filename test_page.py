@@ -0,0 +1,102 @@
+import mmap
+
+import pytest
+
+from page import LecturePage, available_parsers, find_regions, page_regions
+
+ROW = (
+    '<div class="transcript-row"><div class="transcript-time">{}</div>'
+    '<div class="transcript-text">{}</div></div>'
+)
+THUMB = (
+    '<div class="thumbnail" aria-label="Thumbnail at {} seconds">'
+    '<div style="background-image: url(&quot;{}.jpg&quot;)"></div></div>'
+)
+
+PAGES = {
+    "plain": (
+        "<html><head><title>Lecture 1</title></head><body>"
+        + THUMB.format(10, "a")
+        + ROW.format("0:01", "hello")
+        + "</body></html>"
+    ),
+    "comment": (
+        "<html><head><title>Lecture 1</title></head><body>"
+        + "<!-- "
+        + ROW.format("9:99", "commented out")
+        + THUMB.format(99, "x")
+        + " -->"
+        + ROW.format("0:01", "kept")
+        + "<!-- "
+        + ROW.format("9:98", "after the last row")
+        + " -->"
+        + "</body></html>"
+    ),
+    "quoted": (
+        "<html><head><title>Lecture 1</title></head><body>"
+        '<div data-x="a>b" class="transcript-row">'
+        '<div class="transcript-time">0:01</div>'
+        '<div class="transcript-text">first</div></div>'
+        "<div data-y='c<d' class=transcript-row>"
+        '<div class="transcript-time">0:02</div>'
+        '<div class="transcript-text">second</div></div>'
+        '<div title="class=transcript-row">not a row</div>'
+        "</body></html>"
+    ),
+    "uppercase": (
+        "<HTML><HEAD><TITLE>Lecture 1</TITLE>"
+        "<SCRIPT>var t = '<div class=\"transcript-row\">';</SCRIPT>"
+        "<STYLE>.thumbnail { color: red }</STYLE></HEAD><BODY>"
+        + '<DIV CLASS="thumbnail" aria-label="Thumbnail at 20 seconds"></DIV>'
+        + ROW.format("0:03", "upper")
+        + "</BODY></HTML>"
+    ),
+    "scripts": (
+        "<html><head><title>Lecture 1</title>"
+        "<script>var x = '" + "A" * 100_000 + "';</script></head><body>"
+        '<div class="thumbnails">'
+        + THUMB.format(10, "a")
+        + "<script>tpl = '"
+        + THUMB.format(77, "t")
+        + "';</script>"
+        + THUMB.format(20, "b")
+        + "</div>"
+        + ROW.format("0:01", "one <b>bold</b> &amp; more")
+        + ROW.format("1:02:03", "two")
+        + "<script>'transcript-row thumbnail'</script></body></html>"
+    ),
+    "missing": "<html><body><p>nothing here</p></body></html>",
+}
+
+
+def parse(path: str, parser: str, whole: bool) -> tuple:
+    page = LecturePage(path, parser, whole)
+    return page.title, page.rows, page.thumb_labels, page.thumb_styles
+
+
+@pytest.mark.parametrize("parser", available_parsers())
+@pytest.mark.parametrize("name", sorted(PAGES))
+def test_regions_match_whole_page(tmp_path, parser, name):
+    path = tmp_path / "page.html"
+    path.write_text(PAGES[name], encoding="utf-8")
+
+    assert parse(str(path), parser, True) == parse(str(path), parser, False)
+
+
+def test_regions_skip_scripts(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_text(PAGES["scripts"], encoding="utf-8")
+
+    # the inlined script before the markup is never decoded
+    assert sum(len(text) for text in page_regions(str(path))) < 2000
+
+
+def test_empty_page(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_bytes(b"")
+    assert list(page_regions(str(path))) == []
+
+    path.write_bytes(b"<p>no title</p>")
+    with open(path, "rb") as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            assert find_regions(buf) == []
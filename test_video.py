@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("PIL")
+
+from video import in_caller_order, out_of_order, seek_in_order  # noqa: E402
+
+# frames of a stand-in video: one every 2 seconds up to 10
+FRAMES = list(range(0, 12, 2))
+
+
+def frame_at(ts: int) -> int | None:
+    # the first frame at or after ts, None past the end
+    return next((t for t in FRAMES if t >= ts), None)
+
+
+def stream(wanted: list[int]):
+    # like the batch sources: once per distinct timestamp, in time order,
+    # stopping at the end of the video
+    for ts in sorted(set(wanted)):
+        frame = frame_at(ts)
+        if frame is None:
+            return
+        yield ts, frame
+
+
+def test_out_of_order():
+    assert out_of_order([55, 0, 10, 20, 55]) == {0}
+    assert out_of_order([0, 10, 10, 20]) == set()
+    assert out_of_order([0, 5, 3, 9]) == {1}
+
+
+@pytest.mark.parametrize(
+    "timestamps",
+    [
+        [0, 1, 2, 3, 4, 10],
+        # a leading invalid run wrapped around to the last timestamp
+        [10, 10, 0, 2, 4, 10],
+        [30, 0, 2, 4, 30, 10],
+        [9, 0, 1, 4, 9, 20, 3],
+    ],
+)
+def test_caller_order(timestamps):
+    expected = [(ts, frame_at(ts)) for ts in timestamps if frame_at(ts) is not None]
+
+    assert list(in_caller_order(timestamps, stream, stream)) == expected
+    assert list(seek_in_order(frame_at, timestamps, 2)) == expected
@@ -0,0 +1,776 @@
+import bisect
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from fractions import Fraction
+from functools import partial
+from typing import Any, BinaryIO, Callable, Iterator
+from PIL import Image
+
+from cache import part_path
+
+try:
+    import av
+except ImportError:
+    av = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# how seek mode finds the frame for ts: "accurate" seeks to the keyframe
+# before ts and decodes forward to it (ffmpeg's default input seeking),
+# "fast" takes that keyframe as is, and "hybrid" takes the nearest keyframe
+# when it is within HYBRID_TOLERANCE seconds of ts, seeking accurately
+# otherwise
+SEEK_MODES = ["accurate", "fast", "hybrid"]
+SEEK_MODE = "accurate"
+HYBRID_TOLERANCE = 1.0
+
+# decoding threads of each ffmpeg process or PyAV decoder; 0 leaves it to
+# the decoder, which sizes itself as if it had the machine to itself
+_decoder_threads = 0
+
+# process-wide cap on running decoders (ffmpeg processes or PyAV decodes),
+# shared by every lecture; None means no cap
+_decoder_slots: threading.BoundedSemaphore | None = None
+
+
+def set_decoder_budget(slots: int | None) -> None:
+    global _decoder_slots
+    _decoder_slots = threading.BoundedSemaphore(slots) if slots else None
+
+
+def set_decoder_threads(threads: int) -> None:
+    global _decoder_threads
+    _decoder_threads = max(0, threads)
+
+
+def decoder_args() -> list[str]:
+    # input options of every ffmpeg run: never read stdin (a stray keypress
+    # must not stop a batch), ignore the audio, subtitle and data streams,
+    # and keep to our share of the cores
+    args = ["-nostdin", "-an", "-sn", "-dn"]
+    if _decoder_threads:
+        args += ["-threads", str(_decoder_threads)]
+    return args
+
+
+@contextmanager
+def decoder_slot() -> Iterator[None]:
+    # hold one slot of the shared budget while a decoder runs
+    slots = _decoder_slots
+    if slots is None:
+        yield
+        return
+
+    with slots:
+        yield
+
+
+def clock_to_str(ts: int) -> str:
+    h, r = divmod(ts, 3600)
+    m, s = divmod(r, 60)
+    return f"{h:02}:{m:02}:{s:02}"
+
+
+def run_ffmpeg(cmd: list[str]) -> None:
+    # Run the command with no output
+    with decoder_slot():
+        subprocess.run(
+            cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+
+# keyframe times of each video probed so far, for hybrid seeking
+_keyframes: dict[str, list[float]] = {}
+_keyframes_lock = threading.Lock()
+
+
+def probe_keyframes(input_video: str) -> list[float]:
+    # keyframe times relative to the start of the file, read from the packet
+    # headers alone: nothing is decoded
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "format=start_time:packet=pts_time,flags",
+        "-of",
+        "json",
+        input_video,
+    ]
+    with decoder_slot():
+        proc = subprocess.run(
+            cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+
+    info = json.loads(proc.stdout)
+    start = float(info.get("format", {}).get("start_time") or 0)
+    return sorted(
+        float(p["pts_time"]) - start
+        for p in info.get("packets", [])
+        if "K" in p.get("flags", "") and p.get("pts_time") not in (None, "N/A")
+    )
+
+
+def keyframes(input_video: str) -> list[float]:
+    # probed once per video; other threads wait for the first probe
+    with _keyframes_lock:
+        if input_video not in _keyframes:
+            _keyframes[input_video] = probe_keyframes(input_video)
+        return _keyframes[input_video]
+
+
+def seek_args(input_video: str, ts: int, seek: str = SEEK_MODE) -> list[str]:
+    # input options that land on the frame shown for ts
+    # the keyframe is the frame shown, so nothing else needs decoding
+    keyframe_only = ["-noaccurate_seek", "-skip_frame", "nokey"]
+    if seek == "fast":
+        return [*keyframe_only, "-ss", clock_to_str(ts)]
+
+    if seek == "hybrid":
+        kfs = keyframes(input_video)
+        i = bisect.bisect_right(kfs, ts)
+        around = kfs[max(0, i - 1) : i + 1]
+        near = [k for k in around if abs(k - ts) <= HYBRID_TOLERANCE]
+        if near:
+            k = min(near, key=lambda k: abs(k - ts))
+            # just past the keyframe, so rounding never lands on the one before
+            return [*keyframe_only, "-ss", f"{k + 0.001:.3f}"]
+
+    return ["-ss", clock_to_str(ts)]
+
+
+def ffmpeg_frame(
+    input_video: str, ts: int, out_png: str, seek: str = SEEK_MODE
+) -> bool:
+    # one ffmpeg process per frame, input-seeking straight to ts
+    cmd = [
+        "ffmpeg",
+        "-y",
+        *decoder_args(),
+        *seek_args(input_video, ts, seek),
+        "-i",
+        input_video,
+        "-frames:v",
+        "1",
+        part_path(out_png),
+    ]
+    run_ffmpeg(cmd)
+
+    # nothing is written when ts is past the end of the video
+    if not os.path.exists(part_path(out_png)):
+        return False
+    os.replace(part_path(out_png), out_png)
+    return True
+
+
+def read_ppm(fp: BinaryIO) -> Image.Image | None:
+    # one binary PPM as written by ffmpeg's ppm encoder ("P6\nW H\n255\n")
+    magic = fp.readline()
+    if not magic:
+        return None
+    if magic.strip() != b"P6":
+        raise RuntimeError(f"Unexpected frame header from ffmpeg: {magic!r}")
+
+    width, height = (int(v) for v in fp.readline().split())
+    fp.readline()  # maxval, always 255 for rgb24
+
+    size = width * height * 3
+    data = fp.read(size)
+    if len(data) < size:
+        return None
+
+    return Image.frombytes("RGB", (width, height), data)
+
+
+def jpeg_end(buf: bytes | bytearray) -> int:
+    # end offset of the JPEG starting at buf[0], or -1 if it is incomplete;
+    # header segments are skipped by length since their payload may contain
+    # anything, while in scan data a real marker is never followed by 00
+    i = 2
+    while i + 2 <= len(buf):
+        if buf[i] != 0xFF:
+            raise RuntimeError("Corrupt JPEG stream from ffmpeg.")
+        marker = buf[i + 1]
+        if marker == 0xFF:
+            # fill byte
+            i += 1
+            continue
+        if marker == 0xD9:
+            return i + 2
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            i += 2
+            continue
+        if i + 4 > len(buf):
+            return -1
+
+        i += 2 + int.from_bytes(buf[i + 2 : i + 4], "big")
+        if marker != 0xDA:
+            continue
+
+        # entropy-coded data after SOS: look for the next real marker
+        while True:
+            i = buf.find(b"\xff", i)
+            if i < 0 or i + 1 >= len(buf):
+                return -1
+            nxt = buf[i + 1]
+            if nxt == 0x00 or 0xD0 <= nxt <= 0xD7:
+                i += 2
+                continue
+            break
+
+    return -1
+
+
+def read_jpegs(fp: BinaryIO, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    # split a stream of back-to-back JPEGs (ffmpeg image2pipe + mjpeg)
+    buf = bytearray()
+    while True:
+        end = jpeg_end(buf) if len(buf) >= 2 else -1
+        if end >= 0:
+            yield bytes(buf[:end])
+            del buf[:end]
+            continue
+
+        chunk = fp.read1(chunk_size)  # type: ignore[attr-defined]
+        if not chunk:
+            return
+        buf += chunk
+
+
+def qscale_from_quality(quality: int) -> int:
+    # map a PIL-style JPEG quality (1-100) onto ffmpeg's -q:v (31-2)
+    return round(31 - max(1, min(quality, 100)) * 29 / 100)
+
+
+def encode_jpeg(image: Image.Image, quality: int) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def ppm_args() -> list[str]:
+    return ["-f", "image2pipe", "-c:v", "ppm", "pipe:1"]
+
+
+def jpeg_args(quality: int) -> list[str]:
+    return [
+        "-f",
+        "image2pipe",
+        "-c:v",
+        "mjpeg",
+        "-q:v",
+        str(qscale_from_quality(quality)),
+        "pipe:1",
+    ]
+
+
+def ffmpeg_frame_bytes(
+    input_video: str, ts: int, out_args: list[str], seek: str = SEEK_MODE
+) -> bytes:
+    # like ffmpeg_frame, but the encoded frame comes back through a pipe
+    cmd = [
+        "ffmpeg",
+        *decoder_args(),
+        *seek_args(input_video, ts, seek),
+        "-i",
+        input_video,
+        "-frames:v",
+        "1",
+        *out_args,
+    ]
+    with decoder_slot():
+        proc = subprocess.run(
+            cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+
+    # empty when ts is past the end of the video
+    return proc.stdout
+
+
+def ffmpeg_frame_image(
+    input_video: str, ts: int, seek: str = SEEK_MODE
+) -> Image.Image | None:
+    data = ffmpeg_frame_bytes(input_video, ts, ppm_args(), seek)
+    return read_ppm(io.BytesIO(data))
+
+
+def ffmpeg_frame_jpeg(
+    input_video: str, ts: int, quality: int, seek: str = SEEK_MODE
+) -> bytes | None:
+    return ffmpeg_frame_bytes(input_video, ts, jpeg_args(quality), seek) or None
+
+
+def select_expr(timestamps: list[int]) -> str:
+    # true for the first frame at or after each timestamp; prev_t is NAN on
+    # the very first frame, so a timestamp of 0 still matches it
+    return "+".join(f"gte(t,{ts})*not(gte(prev_t,{ts}))" for ts in timestamps)
+
+
+def batch_cmd(
+    input_video: str, wanted: list[int], filters: tuple[str, ...] = ()
+) -> list[str]:
+    # ffmpeg arguments, minus the output, that pick one frame per timestamp;
+    # filters run on the picked frames only. Timestamps that fall on the
+    # same frame (sparse or variable frame rate video) pick it only once, so
+    # showinfo logs the time of each picked frame for FrameTimes
+    return [
+        "ffmpeg",
+        "-y",
+        "-nostats",
+        *decoder_args(),
+        # nothing after the last slide needs decoding
+        "-t",
+        str(wanted[-1] + 1),
+        "-i",
+        input_video,
+        "-vf",
+        ",".join([f"select='{select_expr(wanted)}'", "showinfo", *filters]),
+        "-fps_mode",
+        "passthrough",
+    ]
+
+
+_TIME_BASE_RE = re.compile(rb"config in time_base:\s*(\d+)/(\d+)")
+_SHOWINFO_RE = re.compile(rb"\bn:\s*\d+\s+pts:\s*(-?\d+)\s+pts_time:\s*(\S+)")
+
+# seconds to wait for the time of a frame already read from ffmpeg; its
+# showinfo line is logged before the frame is written, so this only guards
+# against an ffmpeg whose log cannot be parsed
+FRAME_TIME_TIMEOUT = 30.0
+
+
+class FrameTimes:
+    # times of the frames picked by batch_cmd, in output order, read from
+    # the showinfo lines on ffmpeg's stderr by a thread so that the pipe
+    # never fills up
+    def __init__(self, stream: BinaryIO) -> None:
+        self.times: list[Fraction] = []
+        self.done = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._read, args=(stream,), daemon=True)
+        self.thread.start()
+
+    def _read(self, stream: BinaryIO) -> None:
+        time_base = None
+        try:
+            for line in stream:
+                if m := _TIME_BASE_RE.search(line):
+                    time_base = Fraction(int(m.group(1)), int(m.group(2)))
+                elif m := _SHOWINFO_RE.search(line):
+                    # the exact pts when the time base is known
+                    if time_base is not None:
+                        t = int(m.group(1)) * time_base
+                    else:
+                        t = Fraction(m.group(2).decode())
+                    with self.cond:
+                        self.times.append(t)
+                        self.cond.notify_all()
+        finally:
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+
+    def get(self, n: int) -> Fraction:
+        # time of the n-th picked frame (from 0), which has been output
+        with self.cond:
+            self.cond.wait_for(
+                lambda: len(self.times) > n or self.done, FRAME_TIME_TIMEOUT
+            )
+            if len(self.times) <= n:
+                raise RuntimeError("ffmpeg did not log the time of a picked frame.")
+            return self.times[n]
+
+
+def match_frames(
+    wanted: list[int], frames: Iterator[tuple[Fraction, Any]]
+) -> Iterator[tuple[int, Any]]:
+    # (ts, frame) for each wanted timestamp (sorted, distinct) given the
+    # picked (time, frame) pairs in order: the frame for ts is the first one
+    # at or after it, which is shared when several timestamps pick it
+    i = 0
+    for t, frame in frames:
+        while i < len(wanted) and wanted[i] <= t:
+            yield wanted[i], frame
+            i += 1
+
+
+def ffmpeg_frames_batch(
+    input_video: str, timestamps: list[int], out_pngs: list[str]
+) -> list[str]:
+    # every frame in a single ffmpeg run: decode once, keep only the frames
+    # picked by a select filter, then move them to their final names
+    wanted = sorted(set(timestamps))
+    if not wanted:
+        return []
+
+    out_dir = os.path.dirname(out_pngs[0]) or "."
+    with tempfile.TemporaryDirectory(dir=out_dir) as tmp:
+        cmd = batch_cmd(input_video, wanted) + [os.path.join(tmp, "%06d.png")]
+        with decoder_slot():
+            proc = subprocess.Popen(
+                cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+            )
+            assert proc.stderr is not None
+            times = FrameTimes(proc.stderr)
+            times.thread.join()
+            if proc.wait():
+                raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+        # the picked frames are numbered in time order
+        picked = [
+            (t, os.path.join(tmp, f"{n:06}.png")) for n, t in enumerate(times.times, 1)
+        ]
+        frames = dict(match_frames(wanted, iter(picked)))
+
+        saved = []
+        for ts, out_png in zip(timestamps, out_pngs):
+            if ts not in frames or not os.path.exists(frames[ts]):
+                # past the end of the video
+                continue
+            # duplicated timestamps share one decoded frame
+            shutil.copyfile(frames[ts], part_path(out_png))
+            os.replace(part_path(out_png), out_png)
+            saved.append(out_png)
+
+    return saved
+
+
+def pyav_frames(
+    input_video: str, timestamps: list[int]
+) -> Iterator[tuple[int, Image.Image]]:
+    # decode in-process: yield (ts, first frame at or after ts) in time order,
+    # reusing one open decoder for all of them
+    if av is None:
+        raise RuntimeError("PyAV is not installed (pip install av).")
+
+    with decoder_slot(), av.open(input_video) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        if _decoder_threads:
+            stream.codec_context.thread_count = _decoder_threads
+
+        # like ffmpeg -ss, timestamps are relative to the start of the file
+        offset = (container.start_time or 0) / av.time_base
+
+        frames = None
+        last = None
+        last_key = None
+        # longest stretch decoded from a keyframe so far, in seconds: a
+        # lower bound of the keyframe interval that grows from the first
+        # seek on, so dense timestamps soon decode forward
+        gop = 0.0
+        for ts in sorted(set(timestamps)):
+            target = ts + offset
+
+            # within one GOP of the current frame, decoding forward is no
+            # more work than seeking back to the keyframe before target
+            if frames is None or last is None or target - last.time > gop:
+                container.seek(int(target / stream.time_base), stream=stream)
+                frames = container.decode(stream)
+                last = None
+                last_key = None
+
+            while last is None or last.time < target:
+                last = next(frames, None)
+                if last is None:
+                    # past the end of the video
+                    return
+                if last_key is not None:
+                    gop = max(gop, last.time - last_key)
+                if last.key_frame:
+                    last_key = last.time
+
+            yield ts, last.to_image()
+
+
+def pyav_frames_batch(
+    input_video: str, timestamps: list[int], out_pngs: list[str]
+) -> list[str]:
+    # same contract as ffmpeg_frames_batch, without spawning ffmpeg
+    targets: dict[int, list[str]] = {}
+    for ts, out_png in zip(timestamps, out_pngs):
+        targets.setdefault(ts, []).append(out_png)
+
+    saved = []
+    for ts, image in pyav_frames(input_video, timestamps):
+        for out_png in targets[ts]:
+            image.save(part_path(out_png))
+            os.replace(part_path(out_png), out_png)
+            saved.append(out_png)
+
+    # keep the caller's order
+    order = {p: i for i, p in enumerate(out_pngs)}
+    return sorted(saved, key=order.__getitem__)
+
+
+def ffmpeg_frames_pipe(
+    input_video: str, timestamps: list[int], quality: int | None = None
+) -> Iterator[tuple[int, Any]]:
+    # batch extraction with the frames streamed back over stdout: PIL images
+    # (PPM) by default, or encoded JPEG bytes when a quality is given
+    wanted = sorted(set(timestamps))
+    if not wanted:
+        return
+
+    out_args = ppm_args() if quality is None else jpeg_args(quality)
+    cmd = batch_cmd(input_video, wanted) + out_args
+
+    # the slot is held for as long as the pipe is being read
+    with decoder_slot():
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        assert proc.stdout is not None and proc.stderr is not None
+        times = FrameTimes(proc.stderr)
+        try:
+            if quality is None:
+                frames: Iterator[Any] = iter(lambda: read_ppm(proc.stdout), None)
+            else:
+                frames = read_jpegs(proc.stdout)
+
+            # past the end of the video, the frames simply run out
+            timed = ((times.get(n), frame) for n, frame in enumerate(frames))
+            yield from match_frames(wanted, timed)
+        finally:
+            proc.stdout.close()
+            proc.kill()
+            proc.wait()
+
+
+def seek_in_order(
+    fetch: Callable[[int], Any], timestamps: list[int], jobs: int
+) -> Iterator[tuple[int, Any]]:
+    # one fetch per timestamp on a thread pool, yielded in order; at most a
+    # few results are in flight so memory stays bounded. Timestamps may come
+    # in any order, and one past the end of the video is left out
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        pending: deque = deque()
+        for n, ts in enumerate(timestamps, 1):
+            pending.append((ts, pool.submit(fetch, ts)))
+
+            last = n == len(timestamps)
+            while pending and (last or len(pending) > 2 * jobs):
+                done_ts, future = pending.popleft()
+                frame = future.result()
+                if frame is not None:
+                    yield done_ts, frame
+
+
+def out_of_order(timestamps: list[int]) -> set[int]:
+    # positions whose timestamp is later than one after it, e.g. the first
+    # thumbnail of a deck whose leading invalid labels wrapped around to the
+    # last timestamp; the others never go down
+    early = set()
+    low = float("inf")
+    for i in range(len(timestamps) - 1, -1, -1):
+        if timestamps[i] > low:
+            early.add(i)
+        else:
+            low = timestamps[i]
+
+    return early
+
+
+def in_caller_order(
+    timestamps: list[int],
+    stream: Callable[[list[int]], Iterator[tuple[int, Any]]],
+    fetch: Callable[[list[int]], Iterator[tuple[int, Any]]],
+) -> Iterator[tuple[int, Any]]:
+    # (ts, frame) for every timestamp in the caller's order, leaving out
+    # those past the end of the video. stream and fetch give (ts, frame)
+    # once per distinct timestamp in time order: stream for the timestamps
+    # that never go down, in one pass, and fetch, which should seek, for the
+    # few out of order, which are held until their turn
+    early = out_of_order(timestamps)
+    held = dict(fetch(sorted({timestamps[i] for i in early}))) if early else {}
+
+    rest = [ts for i, ts in enumerate(timestamps) if i not in early]
+    frames = stream(rest)
+    current = None
+    for i, ts in enumerate(timestamps):
+        if i in early:
+            if ts in held:
+                yield ts, held[ts]
+            continue
+
+        while frames is not None and (current is None or current[0] < ts):
+            current = next(frames, None)
+            if current is None:
+                # past the end of the video, and so are all later ones
+                frames = None
+        if current is not None and current[0] == ts:
+            yield ts, current[1]
+
+
+def proxy_filter(size: tuple[int, int]) -> str:
+    # frames are scaled down and made 8-bit grayscale inside ffmpeg, so a
+    # full-size frame never leaves the decoder
+    width, height = size
+    return f"scale={width}:{height}:flags=area,format=gray"
+
+
+def raw_gray_args() -> list[str]:
+    return ["-f", "rawvideo", "-pix_fmt", "gray", "pipe:1"]
+
+
+def read_proxy(data: bytes, size: tuple[int, int]) -> Any:
+    width, height = size
+    if len(data) < width * height:
+        # past the end of the video
+        return None
+    return np.frombuffer(data, np.uint8, width * height).reshape(height, width)
+
+
+def ffmpeg_proxy_frame(
+    input_video: str, ts: int, size: tuple[int, int], seek: str = SEEK_MODE
+) -> Any:
+    out_args = ["-vf", proxy_filter(size), *raw_gray_args()]
+    data = ffmpeg_frame_bytes(input_video, ts, out_args, seek)
+    return read_proxy(data, size)
+
+
+def ffmpeg_proxy_pipe(
+    input_video: str, timestamps: list[int], size: tuple[int, int]
+) -> Iterator[tuple[int, Any]]:
+    # batch extraction of proxy frames, streamed back over stdout
+    wanted = sorted(set(timestamps))
+    if not wanted:
+        return
+
+    # the select filter goes first, so only picked frames get scaled
+    cmd = batch_cmd(input_video, wanted, (proxy_filter(size),)) + raw_gray_args()
+    width, height = size
+
+    with decoder_slot():
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        assert proc.stdout is not None and proc.stderr is not None
+        times = FrameTimes(proc.stderr)
+
+        def picked() -> Iterator[tuple[Fraction, Any]]:
+            # not iter(..., None): that compares each array with None
+            n = 0
+            while True:
+                frame = read_proxy(proc.stdout.read(width * height), size)
+                if frame is None:
+                    return
+                yield times.get(n), frame
+                n += 1
+
+        try:
+            # past the end of the video, the frames simply run out
+            yield from match_frames(wanted, picked())
+        finally:
+            proc.stdout.close()
+            proc.kill()
+            proc.wait()
+
+
+def pyav_proxy(
+    input_video: str, timestamps: list[int], size: tuple[int, int]
+) -> Iterator[tuple[int, Any]]:
+    # PyAV hands over full frames, shrunk here before anything else sees them
+    for ts, image in pyav_frames(input_video, timestamps):
+        small = image.convert("L").resize(size, Image.Resampling.BOX)
+        yield ts, np.asarray(small)
+
+
+def iter_proxy(
+    input_video: str,
+    timestamps: list[int],
+    size: tuple[int, int],
+    mode: str = "seek",
+    jobs: int = 1,
+    seek: str = SEEK_MODE,
+) -> Iterator[tuple[int, Any]]:
+    # (ts, height x width uint8 array) for every timestamp, in order: a tiny
+    # grayscale stand-in for the frame, enough to decide which frames to
+    # keep; only those are then extracted at full resolution
+    if np is None:
+        raise RuntimeError("Proxy decoding needs NumPy (pip install numpy).")
+
+    if mode == "seek":
+        return seek_in_order(
+            partial(ffmpeg_proxy_frame, input_video, size=size, seek=seek),
+            timestamps,
+            jobs,
+        )
+
+    if mode == "batch":
+        stream = partial(ffmpeg_proxy_pipe, input_video, size=size)
+        fetch = partial(
+            seek_in_order,
+            partial(ffmpeg_proxy_frame, input_video, size=size),
+            jobs=jobs,
+        )
+    else:
+        stream = fetch = partial(pyav_proxy, input_video, size=size)
+    return in_caller_order(timestamps, stream, fetch)
+
+
+def iter_frames(
+    input_video: str,
+    timestamps: list[int],
+    mode: str = "seek",
+    jobs: int = 1,
+    seek: str = SEEK_MODE,
+) -> Iterator[tuple[int, Image.Image]]:
+    # (ts, frame) for every timestamp, in order, without touching the disk
+    if mode == "seek":
+        return seek_in_order(
+            partial(ffmpeg_frame_image, input_video, seek=seek), timestamps, jobs
+        )
+
+    if mode == "batch":
+        stream = partial(ffmpeg_frames_pipe, input_video)
+        fetch = partial(
+            seek_in_order, partial(ffmpeg_frame_image, input_video), jobs=jobs
+        )
+    else:
+        stream = fetch = partial(pyav_frames, input_video)
+    return in_caller_order(timestamps, stream, fetch)
+
+
+def iter_jpegs(
+    input_video: str,
+    timestamps: list[int],
+    mode: str = "seek",
+    jobs: int = 1,
+    quality: int = 75,
+    seek: str = SEEK_MODE,
+) -> Iterator[tuple[int, bytes]]:
+    # like iter_frames, but each frame is already JPEG-encoded, by ffmpeg
+    # for the subprocess modes and by PIL for pyav
+    if mode == "seek":
+        return seek_in_order(
+            partial(ffmpeg_frame_jpeg, input_video, quality=quality, seek=seek),
+            timestamps,
+            jobs,
+        )
+
+    def pyav_jpegs(wanted: list[int]) -> Iterator[tuple[int, bytes]]:
+        for ts, image in pyav_frames(input_video, wanted):
+            yield ts, encode_jpeg(image, quality)
+
+    if mode == "batch":
+        stream = partial(ffmpeg_frames_pipe, input_video, quality=quality)
+        fetch = partial(
+            seek_in_order,
+            partial(ffmpeg_frame_jpeg, input_video, quality=quality),
+            jobs=jobs,
+        )
+    else:
+        stream = fetch = pyav_jpegs
+    return in_caller_order(timestamps, stream, fetch)